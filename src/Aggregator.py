@@ -0,0 +1,55 @@
+from array import array
+from CsvTool import NULL_INT
+
+class Aggregator:
+    """Aggregates an amount column in integer cents (see the 'cents' column type of CsvTool) over sets of rows.
+    The amounts are copied once into arrays, the signed amounts are negative for the rows of which
+    the direction column (e.g. AfBij) has the value inNegative. Aggregating a set of rows then runs in C
+    with map, sum, min and max, and is exact to the cent"""
+    def __init__ (self, inAmounts, inDirections=None, inNegative='Af'):
+        self.amounts = array ('l')
+        self.signed = array ('l')
+        # the rows with an empty amount, they are not counted
+        self.nulls = set ()
+        self.negative = inNegative
+        self.Extend (inAmounts, inDirections)
+
+    def Extend (self, inAmounts, inDirections=None):
+        """Add the amounts of rows appended to the table"""
+        if inDirections is None:
+            inDirections = [None] * len (inAmounts)
+        for j, (amount, direction) in enumerate (zip (inAmounts, inDirections), len (self.amounts)):
+            if amount is None or amount == NULL_INT:
+                self.nulls.add (j)
+                amount = 0
+            self.amounts.append (amount)
+            self.signed.append (-amount if direction == self.negative else amount)
+
+    def __len__ (self):
+        return len (self.amounts)
+
+    def Aggregate (self, inRows):
+        """Return the count, sum, net (the sum of the signed amounts), min, max and mean of the amounts of the rows.
+        All values are in cents, min, max and mean are None when no row has an amount"""
+        rows = inRows
+        if self.nulls:
+            rows = [j for j in rows if j not in self.nulls]
+        values = map (self.amounts.__getitem__, rows)
+        count = len (values)
+        total = sum (values)
+        ret = {'count': count, 'sum': total, 'net': sum (map (self.signed.__getitem__, rows)),
+               'min': None, 'max': None, 'mean': None}
+        if count:
+            ret ['min'] = min (values)
+            ret ['max'] = max (values)
+            ret ['mean'] = total / float (count)
+        return ret
+
+    def SumBy (self, inRows, inKeys):
+        """Return the sum in cents of the amounts of the rows per key in a dict, inKeys gives the key of every row"""
+        amounts = self.amounts
+        ret = {}
+        for j in inRows:
+            key = inKeys [j]
+            ret [key] = ret.get (key, 0) + amounts [j]
+        return ret
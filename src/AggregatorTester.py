@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+import unittest
+import logging
+from Aggregator import Aggregator
+from CsvTool import NULL_INT
+
+# setup logger
+logging.basicConfig(format='%(asctime)-15s %(message)s', filename='AggregatorTester.log')
+logger = logging.getLogger(__name__)
+
+
+class AggregatorTester(unittest.TestCase):
+
+    def setUp(self):
+        self.aggregator = Aggregator ([45540, 1174, None, 2000, NULL_INT, 1], ['Bij', 'Af', 'Af', 'Af', 'Bij', 'Bij'])
+
+    def testAggregate (self):
+        """The amounts of the rows should be aggregated in cents, the net amount is negative for Af"""
+        expected = {'count': 3, 'sum': 48714, 'net': 45540 - 1174 - 2000, 'min': 1174, 'max': 45540, 'mean': 48714 / 3.0}
+        self.assertEqual (expected, self.aggregator.Aggregate ([0, 1, 2, 3, 4]))
+
+    def testEmpty (self):
+        """Rows without amount should not be counted"""
+        expected = {'count': 0, 'sum': 0, 'net': 0, 'min': None, 'max': None, 'mean': None}
+        self.assertEqual (expected, self.aggregator.Aggregate ([2, 4]))
+        self.assertEqual (expected, self.aggregator.Aggregate ([]))
+
+    def testExact (self):
+        """Summing many amounts should be exact to the cent"""
+        aggregator = Aggregator ([1] * 100000)
+        self.assertEqual (100000, aggregator.Aggregate (xrange (100000)) ['sum'])
+        self.assertEqual (100000, aggregator.Aggregate (xrange (100000)) ['net'])
+
+    def testSumBy (self):
+        """The amounts should be summed per key of the rows"""
+        keys = [2013, 2013, 2014, 2014, None, 2013]
+        self.assertEqual ({2013: 45541, 2014: 2000}, self.aggregator.SumBy ([0, 2, 3, 5], keys))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+from collections import deque
+
+class AhoCorasick:
+    """Aho-Corasick automaton, which finds all patterns occurring in a text in a single pass over the text.
+    It replaces checking 'pattern in text' for every pattern separately when there are many patterns"""
+    def __init__ (self, inPatterns):
+        self.patterns = set (inPatterns)
+        self.lastText = None
+        self.lastMatches = frozenset ()
+
+        # the trie of the patterns: the transitions and the patterns ending in every state
+        self.transitions = [{}]
+        self.outputs = [set ()]
+        for pattern in self.patterns:
+            state = 0
+            for char in pattern:
+                next = self.transitions [state].get (char)
+                if next is None:
+                    next = len (self.transitions)
+                    self.transitions [state][char] = next
+                    self.transitions.append ({})
+                    self.outputs.append (set ())
+                state = next
+            self.outputs [state].add (pattern)
+
+        # the failure state of every state is the longest proper suffix which is also in the trie
+        self.failures = [0] * len (self.transitions)
+        queue = deque (self.transitions [0].values ())
+        while queue:
+            state = queue.popleft ()
+            for char, next in self.transitions [state].items ():
+                queue.append (next)
+                failure = self.failures [state]
+                while failure and char not in self.transitions [failure]:
+                    failure = self.failures [failure]
+                failure = self.transitions [failure].get (char, 0)
+                if failure == next:
+                    failure = 0
+                self.failures [next] = failure
+                self.outputs [next] |= self.outputs [failure]
+        self.outputs = [frozenset (output) for output in self.outputs]
+
+    def FindAll (self, inText):
+        """Return the set of patterns occurring in inText"""
+        transitions = self.transitions
+        failures = self.failures
+        outputs = self.outputs
+        found = set (outputs [0])
+        state = 0
+        for char in inText:
+            while state and char not in transitions [state]:
+                state = failures [state]
+            state = transitions [state].get (char, 0)
+            if outputs [state]:
+                found |= outputs [state]
+        return found
+
+    def ContainsAny (self, inText):
+        """Return whether any of the patterns occurs in inText, stops at the first one found"""
+        transitions = self.transitions
+        failures = self.failures
+        outputs = self.outputs
+        if outputs [0]:
+            return True
+        state = 0
+        for char in inText:
+            while state and char not in transitions [state]:
+                state = failures [state]
+            state = transitions [state].get (char, 0)
+            if outputs [state]:
+                return True
+        return False
+
+    def GetMatches (self, inText):
+        """Like FindAll, but the result for the last text is remembered.
+        Queries sharing the automaton call this for the same cell of a row, which is then scanned only once"""
+        if inText is not self.lastText:
+            self.lastMatches = self.FindAll (inText)
+            self.lastText = inText
+        return self.lastMatches
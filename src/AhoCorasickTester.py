@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+import unittest
+import logging
+from AhoCorasick import AhoCorasick
+
+# setup logger
+logging.basicConfig(format='%(asctime)-15s %(message)s', filename='AhoCorasickTester.log')
+logger = logging.getLogger(__name__)
+
+
+class AhoCorasickTester(unittest.TestCase):
+
+    def setUp(self):
+        self.automaton = AhoCorasick (['gamma', 'formido', 'he', 'she', 'hers', 'ma lei'])
+
+    def testFindAll (self):
+        """All patterns occurring in the text should be found, also overlapping ones"""
+        self.assertEqual (set (['gamma', 'ma lei']), self.automaton.FindAll ('gamma leiden'))
+        self.assertEqual (set (['he', 'she', 'hers']), self.automaton.FindAll ('ushers'))
+        self.assertEqual (set (), self.automaton.FindAll ('intratuin'))
+        self.assertEqual (set (), self.automaton.FindAll (''))
+
+    def testContainsAny (self):
+        """ContainsAny should tell whether any pattern occurs in the text"""
+        self.assertEqual (True, self.automaton.ContainsAny ('de formidoshop'))
+        self.assertEqual (False, self.automaton.ContainsAny ('GAMMA'))
+
+    def testSameAsIn (self):
+        """The automaton should find the same patterns as checking them one by one"""
+        patterns = ['aab', 'ab', 'b', 'bab', 'abba', 'baa']
+        automaton = AhoCorasick (patterns)
+        for text in ['aabbabaa', 'abab', 'bbbb', 'aaaa', 'babba']:
+            expected = set (pattern for pattern in patterns if pattern in text)
+            self.assertEqual (expected, automaton.FindAll (text))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import resource
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+from multiprocessing import Pool
+from CsvTool import CsvTool
+from IngTool import IngTool
+from QueryCompiler import QueryCompiler
+from StatementGenerator import StatementGenerator
+
+def RunBenchmark(inCsvFile, inQueryFile, inAccountsFile, inColumnar):
+    """Measure one configuration, this runs in a worker process so the peak memory is of this configuration only"""
+    ret = {}
+    start = time.time ()
+    csvTool = CsvTool (inColumnar, inColTypes=IngTool.COL_TYPES)
+    csvTool.LoadFile (inCsvFile)
+    ret ['load'] = time.time () - start
+    ret ['rows'] = csvTool.GetRowCount ()
+    ret ['loadRowsPerSecond'] = ret ['rows'] / max (ret ['load'], 1e-9)
+
+    ing = IngTool (inColumnar)
+    ing.LoadAccountsFromFile (inAccountsFile)
+    ing.files = [inCsvFile]
+    ing.csv = csvTool
+    compiler = QueryCompiler (ing.accounts)
+    queries = [compiler.ConvertQueryToTree (query) for query in ElementTree.parse (inQueryFile).getroot ()]
+
+    # the latency of a query when it is run alone, on at most MAX_TIMED_QUERIES queries
+    latencies = []
+    for tree in queries [:Benchmark.MAX_TIMED_QUERIES]:
+        start = time.time ()
+        csvTool.RunQuery (tree)
+        latencies.append (time.time () - start)
+    ret ['queryLatency'] = sum (latencies) / max (len (latencies), 1)
+    ret ['maxQueryLatency'] = max (latencies or [0.0])
+    ret ['queryRowsPerSecond'] = ret ['rows'] / max (ret ['queryLatency'], 1e-9)
+
+    start = time.time ()
+    ing.RunQueriesFromFile (inQueryFile)
+    ret ['report'] = time.time () - start
+    ret ['reportRowsPerSecond'] = ret ['rows'] / max (ret ['report'], 1e-9)
+    # ru_maxrss is in kilobytes on linux
+    ret ['peakMemory'] = resource.getrusage (resource.RUSAGE_SELF).ru_maxrss
+    return ret
+
+class Benchmark:
+    """Measures how CsvTool and IngTool scale on generated statements (see StatementGenerator).
+    For every number of rows and categories it reports the load time, the latency of a query run alone,
+    the time of the whole report (IngTool.RunQueriesFromFile on the loaded table), rows per second and peak memory.
+    The generated files are kept in inDirectory, so they are only generated once"""
+    MAX_TIMED_QUERIES = 20
+
+    def __init__ (self, inDirectory, inAccountsFile=None):
+        self.directory = inDirectory
+        if not os.path.isdir (self.directory):
+            os.makedirs (self.directory)
+        self.generator = StatementGenerator (inAccountsFile)
+        self.accountsFile = os.path.join (self.directory, 'accounts.xml')
+        self.generator.WriteAccounts (self.accountsFile)
+
+    def Run (self, inRows, inCategories, inColumnar=False):
+        """Return the measurements of one configuration in a dict"""
+        csvFile = os.path.join (self.directory, 'statements_%d.csv' % inRows)
+        if not os.path.exists (csvFile):
+            self.generator.WriteCsv (csvFile, inRows)
+        queryFile = os.path.join (self.directory, 'queries_%d.xml' % inCategories)
+        if not os.path.exists (queryFile):
+            self.generator.WriteQueries (queryFile, inCategories)
+
+        pool = Pool (1)
+        try:
+            ret = pool.apply (RunBenchmark, (csvFile, queryFile, self.accountsFile, inColumnar))
+        finally:
+            pool.close ()
+            pool.join ()
+        ret ['categories'] = inCategories
+        ret ['columnar'] = inColumnar
+        return ret
+
+    def RunAll (self, inRows=(10000, 1000000, 10000000), inCategories=(10, 100, 1000), inColumnar=(False, True)):
+        """Run every combination and print the measurements, returns them in a list"""
+        ret = []
+        for rows in inRows:
+            for categories in inCategories:
+                for columnar in inColumnar:
+                    result = self.Run (rows, categories, columnar)
+                    print ("rows %(rows)9d categories %(categories)5d columnar %(columnar)-5s load %(load)8.2fs "
+                           "query %(queryLatency)8.4fs report %(report)8.2fs %(reportRowsPerSecond)10.0f rows/s "
+                           "peak %(peakMemory)8d kB" % result)
+                    ret.append (result)
+        return ret
+
+if __name__ == '__main__':
+    # python Benchmark.py DIRECTORY [ROWS[,ROWS...] [CATEGORIES[,CATEGORIES...]]]
+    benchmark = Benchmark (sys.argv [1], "config/accounts.xml")
+    rows = (10000, 1000000, 10000000)
+    categories = (10, 100, 1000)
+    if len (sys.argv) > 2:
+        rows = [int (value) for value in sys.argv [2].split (',')]
+    if len (sys.argv) > 3:
+        categories = [int (value) for value in sys.argv [3].split (',')]
+    benchmark.RunAll (rows, categories)
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+import unittest
+import logging
+import shutil
+import tempfile
+from Benchmark import Benchmark
+
+# setup logger
+logging.basicConfig(format='%(asctime)-15s %(message)s', filename='BenchmarkTester.log')
+logger = logging.getLogger(__name__)
+
+
+class BenchmarkTester(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp ()
+
+    def tearDown(self):
+        shutil.rmtree (self.directory)
+
+    def testRun (self):
+        """A benchmark should report the measurements of a configuration"""
+        result = Benchmark (self.directory, "test/test_accounts.xml").Run (300, 10, True)
+        self.assertEqual (300, result ['rows'])
+        self.assertEqual (10, result ['categories'])
+        for key in ['load', 'loadRowsPerSecond', 'queryLatency', 'maxQueryLatency', 'queryRowsPerSecond', 'report', 'reportRowsPerSecond', 'peakMemory']:
+            self.assertTrue (result [key] > 0, key)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import binascii
+
+class Bitmap:
+    """Set of row ids stored as the bits of one python long, bit j is set when row j is in the set.
+    The bitwise operations run in C over the words of the long, so intersecting two sets takes O(rows/64) steps"""
+    def __init__ (self, inRows=(), inBits=0):
+        self.bits = inBits
+        rows = list (inRows)
+        if rows:
+            # set the bits in a byte array first, setting them in the long one by one would copy it for every row
+            buffer = bytearray ((max (rows) >> 3) + 1)
+            for j in rows:
+                buffer [j >> 3] |= 1 << (j & 7)
+            buffer.reverse ()
+            self.bits |= int (binascii.hexlify (buffer), 16)
+
+    def __and__ (self, inOther):
+        return Bitmap (inBits=self.bits & inOther.bits)
+
+    def __or__ (self, inOther):
+        return Bitmap (inBits=self.bits | inOther.bits)
+
+    def __sub__ (self, inOther):
+        return Bitmap (inBits=self.bits & ~inOther.bits)
+
+    def __eq__ (self, inOther):
+        return isinstance (inOther, Bitmap) and self.bits == inOther.bits
+
+    def __ne__ (self, inOther):
+        return not self == inOther
+
+    def __nonzero__ (self):
+        return self.bits != 0
+
+    def __len__ (self):
+        return bin (self.bits).count ('1')
+
+    def __iter__ (self):
+        """Yield the rows in ascending order"""
+        if not self.bits:
+            return
+        hexBits = '%x' % self.bits
+        buffer = bytearray (binascii.unhexlify ('0' * (len (hexBits) % 2) + hexBits))
+        buffer.reverse ()
+        for k, byte in enumerate (buffer):
+            if byte:
+                for bit in range (8):
+                    if byte & (1 << bit):
+                        yield (k << 3) | bit
+
+    def __repr__ (self):
+        return 'Bitmap (%r)' % list (self)
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+import unittest
+import logging
+from Bitmap import Bitmap
+
+# setup logger
+logging.basicConfig(format='%(asctime)-15s %(message)s', filename='BitmapTester.log')
+logger = logging.getLogger(__name__)
+
+
+class BitmapTester(unittest.TestCase):
+
+    def setUp(self):
+        self.bitmap = Bitmap ([3, 0, 64, 9, 3])
+
+    def testRows (self):
+        """The bitmap should contain every row once and yield them in ascending order"""
+        self.assertEqual ([0, 3, 9, 64], list (self.bitmap))
+        self.assertEqual (4, len (self.bitmap))
+        self.assertEqual ([], list (Bitmap ()))
+        self.assertEqual (False, bool (Bitmap ()))
+
+    def testOperators (self):
+        """The set operators should work on the bits"""
+        other = Bitmap ([1, 3, 64, 1000])
+        self.assertEqual ([3, 64], list (self.bitmap & other))
+        self.assertEqual ([0, 1, 3, 9, 64, 1000], list (self.bitmap | other))
+        self.assertEqual ([0, 9], list (self.bitmap - other))
+        self.assertEqual (Bitmap ([64, 3]), self.bitmap & other)
+
+if __name__ == '__main__':
+    unittest.main()
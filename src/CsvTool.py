@@ -1,34 +1,499 @@
 import csv
 import datetime
+import hashlib
 import logging
+import os
+import re
+import sys
+import time
+import uuid
+from array import array
+from itertools import chain, islice, izip
+from multiprocessing import Pool
+from QueryCompiler import QueryCompiler
+from AhoCorasick import AhoCorasick
+from Bitmap import Bitmap
+from DictionaryColumn import DictionaryColumn
+from HashIndex import HashIndex
+from Profiler import Profiler
+from SortedIndex import SortedIndex
+from TrigramIndex import TrigramIndex
 logger = logging.getLogger(__name__)
 
+class Missing:
+    """The value of an empty cell in a float or int column, any comparison with it is False"""
+    def __eq__(self, inOther):
+        return False
+    __ne__ = __lt__ = __le__ = __gt__ = __ge__ = __eq__
+
+    def __contains__(self, inOther):
+        return False
+
+    def __nonzero__(self):
+        return False
+
+MISSING = Missing()
+
+# the values of empty cells in the columns of the columnar backend
+NULL_INT = -sys.maxint - 1
+NULL_FLOAT = float ('nan')
+
+# the column types which are converted when loading, date columns are stored as int YYYYMMDD
+# and cents columns (amounts) as int cents, which is never determined from the cells but has to be given
+NUMERIC_TYPES = ('int', 'float', 'date', 'cents')
+
+# compiled patterns to classify the cells when determining the column types
+INT_PATTERN = re.compile (r'\s*[-+]?\d+\s*$')
+FLOAT_PATTERN = re.compile (r'\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$')
+DATUM_PATTERN = re.compile (r'(19|20)\d\d(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])$')
+DATE_PATTERN = re.compile (r'[A-Z][a-z]{2} \d{1,2}, \d{4}$')
+
+def ReadCsvFile(inFilename):
+    """Read a CSV file in a worker process of CsvTool.LoadFile, see CsvTool.ReadFile"""
+    return CsvTool().ReadFile(inFilename)
+
+def ReadTypedCsvFile(inArguments):
+    """Read and type a CSV file in a worker process of CsvTool.LoadFile, inArguments are the file and the given column types.
+    See CsvTool.ReadTypedFile"""
+    filename, colTypes = inArguments
+    return CsvTool(inColTypes=colTypes).ReadTypedFile(filename)
+
 class CsvTool:
-    """ This tool allows you to read CSV file by python and easily apply queries on it"""
-    def __init__(self):
+    """ This tool allows you to read CSV file by python and easily apply queries on it.
+    By default the table is stored as a list of rows. With inColumnar the table is stored as one typed column per header:
+    array('l') for int, date and cents columns, array('d') for float columns and a list of interned strings for string columns.
+    String columns with few distinct values are stored as a DictionaryColumn, the queries compare their codes instead of the strings.
+    The types of the columns in inColTypes are given instead of determined, e.g. 'cents' for amounts which are summed exactly.
+    For the string columns in inTextIndexes a TrigramIndex is built when loading, which is used by queries with substrings of these columns.
+    For the numeric and date columns in inSortedIndexes a SortedIndex is built when loading, which is used by range terms of query trees.
+    With inQueryCache (a QueryCache) the rows matching a query are cached for the loaded data.
+    With inProfiler (a Profiler) the time of the stages of loading and of every query is recorded.
+    With inColumns only these columns are loaded, the cells of the other columns are not cleaned, typed or stored.
+    Equality terms of query trees are answered by a HashIndex of their column, which is built the first time it is needed,
+    unless the column has too many distinct values"""
+    # the maximal number of rows on which the column types are determined
+    SAMPLE_SIZE = 1000
+    # string columns with at most MAX_DICTIONARY_SIZE distinct values, of which every value occurs on average
+    # at least DICTIONARY_REPEATS times, are dictionary-encoded by the columnar backend.
+    # Hash indexes are only built on columns of any type with as few distinct values
+    MAX_DICTIONARY_SIZE = 1 << 16
+    DICTIONARY_REPEATS = 4
+
+    def __init__(self, inColumnar=False, inTextIndexes=(), inColTypes=None, inSortedIndexes=(), inQueryCache=None, inProfiler=None, inColumns=None):
         self.csvTable = []
         self.headers = []
         self.colTypes = []
+        # the types of columns which are not determined from their cells, e.g. {'BedragEUR': 'cents'}
+        self.fixedColTypes = dict (inColTypes or {})
+        self.columnar = inColumnar
+        self.columns = []
+        self.nullColumns = []
+        self.sources = []
+        self.textIndexColumns = list (inTextIndexes)
+        self.textIndexes = {}
+        self.sortedIndexColumns = list (inSortedIndexes)
+        self.sortedIndexes = {}
+        self.hashIndexes = {}
+        self.buckets = {}
+        self.queryCache = inQueryCache
+        self.fingerprint = None
+        self.profiler = inProfiler or Profiler (False)
+        # the columns which are loaded, None for all columns, and their indices in the rows of the last CSV file
+        self.projection = None
+        if inColumns is not None:
+            self.projection = set (inColumns)
+        self.columnIndices = None
+        # the query tree of a filtered load and its function of the rows read from a CSV file, see LoadFile
+        self.filter = None
+        self.rowFilter = None
+        # the line in its CSV file of every row of a filtered load
+        self.lines = None
         
-    def LoadFile(self, inFilename):
-        if isinstance (inFilename, list):
-            headerprev = None
-            for filename in inFilename:
-                csvData = csv.reader (open (filename))
+    def LoadFile(self, inFilename, inProcesses=None, inCache=None, inFilter=None):
+        """Load one or more CSV files, determine the column types and convert all cells to their type once.
+        With inProcesses a list of files is read, cleaned and counted for type inference by a pool of worker processes,
+        the results are merged in the order of the list.
+        With inCache (a TableCache) files which did not change since they were cached are not read again, the cache keeps
+        the typed columns of every file, so they are not converted again either, see __LoadTypedFiles.
+        With inFilter (a query tree) only the rows matching it are loaded, see __GetRowFilter.
+        Files which are read one by one are filtered while they are read, so the other rows are never cleaned or stored,
+        files read by worker processes or from the cache are filtered when they are merged"""
+        loadStart = self.profiler.Start ()
+        self.sources = []
+        self.filter = inFilter
+        self.rowFilter = None
+        self.lines = None
+        if inFilter is not None:
+            self.lines = array ('l')
+        if not isinstance (inFilename, list) and inCache:
+            inFilename = [inFilename]
+        if isinstance (inFilename, list) and inCache:
+            self.__LoadTypedFiles (inFilename, inProcesses, inCache)
+        elif isinstance (inFilename, list) and inProcesses:
+            self.__LoadFilesPerFile (inFilename, inProcesses)
+        else:
+            if isinstance (inFilename, list):
+                headerprev = None
+                for filename in inFilename:
+                    csvData = csv.reader (open (filename))
+                    self.sources.append ((filename, self.GetRowCount (), 2))
+                    self.__GetCsvTable (csvData)
+                    if headerprev:
+                        if self.headers != headerprev:
+                            print self.headers
+                            print headerprev
+                            logger.error ("Header of CSV file %s is not the same as the previous one!", filename)
+                            assert (False)
+                    headerprev = self.headers
+                    
+            else:
+                csvData = csv.reader (open (inFilename))
+                self.sources.append ((inFilename, self.GetRowCount (), 2))
                 self.__GetCsvTable (csvData)
-                if headerprev:
-                    if self.headers != headerprev:
-                        print self.headers
-                        print headerprev
-                        logger.error ("Header of CSV file %s is not the same as the previous one!", filename)
-                        assert (False)
-                headerprev = self.headers
-                
+            
+            start = self.profiler.Start ()
+            self.__SetColType()
+            self.profiler.Stop ('typeInference', start)
+        if not inCache:
+            self.__SetFixedColTypes()
+            
+            start = self.profiler.Start ()
+            if self.columnar:
+                self.__SetColumns()
+            else:
+                self.__SetRowTypes()
+            self.profiler.Stop ('convert', start)
+        
+        start = self.profiler.Start ()
+        self.__ResetIndexes ()
+        self.profiler.Stop ('indexes', start)
+        self.profiler.Stop ('load', loadStart)
+        self.profiler.Count ('rowsLoaded', self.GetRowCount ())
+
+    def __ResetIndexes(self):
+        """Drop the indexes of the previous table and build the text and sorted indexes which were asked for"""
+        self.fingerprint = self.__GetFingerprint ()
+        self.hashIndexes = {}
+        self.buckets = {}
+        self.textIndexes = {}
+        for header in self.textIndexColumns:
+            self.CreateTextIndex (header)
+        self.sortedIndexes = {}
+        for header in self.sortedIndexColumns:
+            self.CreateSortedIndex (header)
+
+    def __ExtendIndexes(self, inFirstRow):
+        """Add the rows from inFirstRow on to the indexes and the buckets which were built before"""
+        self.fingerprint = self.__GetFingerprint ()
+        # a column without a hash index keeps it, its number of distinct values is not counted again
+        for header, index in self.hashIndexes.items ():
+            if index is not None:
+                index.Extend (self.GetColumn (header, inFirstRow), inFirstRow)
+        for header, index in self.textIndexes.items ():
+            index.Extend (self.GetColumn (header, inFirstRow))
+        for header, index in self.sortedIndexes.items ():
+            index.Extend (self.GetColumn (header, inFirstRow), inFirstRow)
+        for (header, period), buckets in self.buckets.items ():
+            buckets.extend (self.__GetBuckets (self.GetColumn (header, inFirstRow), period))
+
+    def __GetFingerprint(self):
+        """Identify the loaded data for the query cache: the files with their modification time and size,
+        the number of rows, the column types and the filter. Rows which are not from a file make the fingerprint unique"""
+        sources = []
+        for filename, firstRow, firstLine in self.sources:
+            if os.path.isfile (filename):
+                stat = os.stat (filename)
+                sources.append ((filename, firstRow, stat.st_mtime, stat.st_size))
+            else:
+                sources.append ((filename, firstRow, uuid.uuid4 ().hex))
+        data = (sources, self.GetRowCount (), self.headers, sorted (self.colTypes.items ()), self.filter)
+        return hashlib.sha1 (repr (data)).hexdigest ()
+
+    def __LoadFilesPerFile(self, inFilenames, inProcesses):
+        """Read every file separately by a pool of worker processes, and merge them"""
+        pool = Pool (inProcesses)
+        try:
+            results = pool.map (ReadCsvFile, inFilenames)
+        finally:
+            pool.close ()
+            pool.join ()
+        
+        headerprev = None
+        counts = None
+        for filename, (headers, rows, fileCounts) in zip (inFilenames, results):
+            # the files are read with all their rows and columns
+            self.headers = self.__ProjectHeaders (headers)
+            if self.filter is not None:
+                self.rowFilter = self.__GetRowFilter (headers, rows [:self.SAMPLE_SIZE])
+                selected = [k for k, row in enumerate (rows) if self.rowFilter (row)]
+                # the rows of the workers have no line numbers, a row is assumed to take one line
+                self.lines.extend (k + 2 for k in selected)
+                rows = [rows [k] for k in selected]
+            if self.projection is not None:
+                rows = ([row [i] for i in self.columnIndices] for row in rows)
+                fileCounts = [fileCounts [i] for i in self.columnIndices]
+            if headerprev and self.headers != headerprev:
+                logger.error ("Header of CSV file %s is not the same as the previous one!", filename)
+                raise ValueError ("Header of CSV file %s is not the same as the previous one" % filename)
+            headerprev = self.headers
+            
+            self.sources.append ((filename, self.GetRowCount (), 2))
+            for row in rows:
+                self.__AddRow (row)
+            if counts is None:
+                counts = [dict (count) for count in fileCounts]
+            else:
+                for count, fileCount in zip (counts, fileCounts):
+                    for type in count:
+                        count [type] += fileCount [type]
+        
+        if self.filter is not None:
+            # the counts are of all rows of the files
+            self.__SetColType ()
+            return
+        self.colTypes = {}
+        for header, count in zip (self.headers, counts or []):
+            self.colTypes [header] = self.__GetColTypeFromCounts (count)
+
+    def __LoadTypedFiles(self, inFilenames, inProcesses, inCache):
+        """Load the typed columns of every file (see ReadTypedFile) from the cache, the files which are not cached are read
+        and typed, by a pool of worker processes with inProcesses, and cached. The types of the table are determined on the
+        counts of all rows of the files, also with a filter. The columns of which every file has that type are concatenated without converting a cell,
+        the other columns are converted again from the cells in the CSV files"""
+        givenTypes = sorted (self.fixedColTypes.items ())
+        results = [inCache.Get (filename) for filename in inFilenames]
+        # the types of a cached file depend on the given types
+        results = [result if result is not None and result [0] == givenTypes else None for result in results]
+        missing = [(filename, self.fixedColTypes) for filename, result in zip (inFilenames, results) if result is None]
+        
+        if missing and inProcesses:
+            pool = Pool (inProcesses)
+            try:
+                read = pool.map (ReadTypedCsvFile, missing)
+            finally:
+                pool.close ()
+                pool.join ()
         else:
-            csvData = csv.reader (open (inFilename))
-            self.__GetCsvTable (csvData)
+            read = [ReadTypedCsvFile (arguments) for arguments in missing]
+        
+        read = iter (read)
+        for k, filename in enumerate (inFilenames):
+            if results [k] is None:
+                results [k] = read.next ()
+                inCache.Put (filename, results [k])
+        
+        start = self.profiler.Start ()
+        headerprev = None
+        counts = None
+        files = []
+        rowCount = 0
+        for filename, (givenTypes, headers, fileCounts, types, columns) in zip (inFilenames, results):
+            self.headers = self.__ProjectHeaders (headers)
+            selected = None
+            if self.filter is not None:
+                selected = self.__FilterTypedFile (headers, types, columns)
+                # the cached rows have no line numbers, a row is assumed to take one line
+                self.lines.extend (k + 2 for k in selected)
+            if self.projection is not None:
+                fileCounts = [fileCounts [i] for i in self.columnIndices]
+                types = [types [i] for i in self.columnIndices]
+                columns = [columns [i] for i in self.columnIndices]
+            if headerprev and self.headers != headerprev:
+                logger.error ("Header of CSV file %s is not the same as the previous one!", filename)
+                raise ValueError ("Header of CSV file %s is not the same as the previous one" % filename)
+            headerprev = self.headers
+            
+            self.sources.append ((filename, rowCount, 2))
+            if selected is not None:
+                rowCount += len (selected)
+            elif columns:
+                rowCount += self.__GetPackedLength (columns [0])
+            files.append ((filename, types, columns, selected))
+            if counts is None:
+                counts = [dict (count) for count in fileCounts]
+            else:
+                for count, fileCount in zip (counts, fileCounts):
+                    for type in count:
+                        count [type] += fileCount [type]
         
-        self.__SetColType()
+        self.colTypes = {}
+        for header, count in zip (self.headers, counts or []):
+            self.colTypes [header] = self.__GetColTypeFromCounts (count)
+        self.__SetFixedColTypes ()
+        self.profiler.Stop ('typeInference', start)
+        
+        start = self.profiler.Start ()
+        self.nullColumns = []
+        columns = []
+        for i, header in enumerate (self.headers):
+            type = self.colTypes [header]
+            if all (types [i] == type for filename, types, packed, selected in files):
+                column = self.__MergeColumns (type, [(packed [i], selected) for filename, types, packed, selected in files])
+                if type in NUMERIC_TYPES and any (packed [i] [3] for filename, types, packed, selected in files):
+                    self.nullColumns.append (i)
+            else:
+                # a file of which the column has another type is converted again from its cells
+                cells = []
+                for filename, types, packed, selected in files:
+                    cells.extend (self.__GetCells (filename, i, types [i], packed [i], selected))
+                column = self.__TypeColumn (i, cells)
+            columns.append (column)
+        if self.columnar:
+            self.columns = columns
+        else:
+            self.__SetRowsFromColumns (columns)
+        self.profiler.Stop ('convert', start)
+
+    def __FilterTypedFile(self, inHeaders, inTypes, inColumns):
+        """Return the rows of a typed file (see ReadTypedFile) which match the filter.
+        Only the cells of the columns used by the filter are unpacked"""
+        compiler = QueryCompiler ()
+        predicate = compiler.BuildPredicate (self.filter, inHeaders, dict (zip (inHeaders, inTypes)))
+        used = [inHeaders.index (header) for header in compiler.GetColumns (self.filter)]
+        cells = [self.__UnpackCells (inTypes [i], inColumns [i]) for i in used]
+        row = [None] * len (inHeaders)
+        selected = []
+        for k, values in enumerate (izip (*cells)):
+            for i, value in izip (used, values):
+                row [i] = value
+            if predicate (row):
+                selected.append (k)
+        return selected
+
+    def __UnpackCells(self, inType, inPacked):
+        """Return the typed values of a packed column (see __PackColumn), empty cells of numeric columns are None"""
+        typecode, data, values, hasNull = inPacked
+        if typecode is None:
+            return values
+        codes = array (typecode)
+        codes.fromstring (data)
+        if inType not in NUMERIC_TYPES:
+            return map (values.__getitem__, codes)
+        if not hasNull:
+            return codes
+        return [None if self.__IsNull (value) else value for value in codes]
+
+    def __GetPackedLength(self, inPacked):
+        """Return the number of cells of a packed column, see __PackColumn"""
+        typecode, data, values, hasNull = inPacked
+        if typecode is None:
+            return len (values)
+        return len (data) // array (typecode).itemsize
+
+    def __GetCells(self, inFilename, inIndex, inType, inPacked, inSelected):
+        """Return the cells of a column of a file as strings, which are read from the CSV file again for a numeric column"""
+        if inType not in NUMERIC_TYPES:
+            cells = self.__UnpackCells (inType, inPacked)
+        else:
+            headers, rows, counts = CsvTool ().ReadFile (inFilename)
+            i = inIndex if self.projection is None else self.columnIndices [inIndex]
+            cells = [row [i] for row in rows]
+        if inSelected is not None:
+            cells = [cells [k] for k in inSelected]
+        return cells
+
+    def __MergeColumns(self, inType, inParts):
+        """Concatenate the packed columns (see __PackColumn) of the files, which have the type inType, with the selected rows
+        of every file. The codes of string columns are mapped to the merged distinct values"""
+        if inType in NUMERIC_TYPES:
+            column = array ('d' if inType == 'float' else 'l')
+            for (typecode, data, values, hasNull), selected in inParts:
+                if selected is None:
+                    column.fromstring (data)
+                else:
+                    part = array (typecode)
+                    part.fromstring (data)
+                    column.extend (map (part.__getitem__, selected))
+            return column
+        
+        if any (typecode is None for (typecode, data, values, hasNull), selected in inParts):
+            # a string column with many distinct values is kept as strings
+            column = []
+            for packed, selected in inParts:
+                cells = self.__UnpackCells (inType, packed)
+                if selected is not None:
+                    cells = [cells [k] for k in selected]
+                column.extend (cells)
+            distinct = len (set (column))
+            if distinct <= self.MAX_DICTIONARY_SIZE and distinct * self.DICTIONARY_REPEATS <= len (column):
+                column = DictionaryColumn (column)
+            return column
+        
+        merged = []
+        codeOfValue = {}
+        codes = array ('l')
+        for (typecode, data, values, hasNull), selected in inParts:
+            part = array (typecode)
+            part.fromstring (data)
+            if selected is not None:
+                part = map (part.__getitem__, selected)
+            mapping = []
+            for value in values:
+                code = codeOfValue.get (value)
+                if code is None:
+                    code = codeOfValue [value] = len (merged)
+                    merged.append (value)
+                mapping.append (code)
+            codes.extend (map (mapping.__getitem__, part))
+        if len (merged) <= self.MAX_DICTIONARY_SIZE and len (merged) * self.DICTIONARY_REPEATS <= len (codes):
+            return DictionaryColumn (inValues=merged, inCodes=codes)
+        return map (merged.__getitem__, codes)
+
+    def __SetRowsFromColumns(self, inColumns):
+        """Set the table of the row backend from typed columns, the null values of empty cells become None"""
+        columns = []
+        for i, column in enumerate (inColumns):
+            if isinstance (column, DictionaryColumn):
+                column = list (column)
+            elif i in self.nullColumns:
+                column = [None if self.__IsNull (value) else value for value in column]
+            columns.append (column)
+        self.csvTable = map (list, izip (*columns))
+        # the row backend has no null values
+        self.nullColumns = []
+
+    def ReadTypedFile(self, inFilename):
+        """Read, clean and type a CSV file without storing it, this is what the TableCache keeps of a file.
+        Returns the given column types (see inColTypes), the headers, for every column the number of cells per type (see ReadFile),
+        the column types, which are the given type or determined on the file, and the packed typed columns, see __PackColumn"""
+        headers, rows, counts = self.ReadFile (inFilename)
+        self.columnar = True
+        self.sources = [(inFilename, 0, 2)]
+        self.columns = [list (column) for column in izip (*rows)] [:len (headers)]
+        if not self.columns:
+            self.columns = [[] for header in headers]
+        self.colTypes = {}
+        for header, count in zip (headers, counts):
+            self.colTypes [header] = self.__GetColTypeFromCounts (count)
+        self.__SetFixedColTypes ()
+        self.__SetColumns ()
+        types = [self.colTypes [header] for header in headers]
+        columns = [self.__PackColumn (i, column) for i, column in enumerate (self.columns)]
+        return sorted (self.fixedColTypes.items ()), headers, counts, types, columns
+
+    def __PackColumn(self, inIndex, inColumn):
+        """Return a typed column as (typecode, string of the array, distinct values, whether it has empty cells), see array.tostring.
+        The array of a numeric column has the values, with NULL_INT or NULL_FLOAT for empty cells,
+        the array of a dictionary-encoded string column has the codes of its cells in the distinct values, see DictionaryColumn.
+        Another string column has no array, its cells are the values"""
+        if isinstance (inColumn, array):
+            return inColumn.typecode, inColumn.tostring (), None, inIndex in self.nullColumns
+        if isinstance (inColumn, DictionaryColumn):
+            return inColumn.codes.typecode, inColumn.codes.tostring (), inColumn.values, False
+        return None, None, inColumn, False
+
+    def ReadFile(self, inFilename):
+        """Read and clean a CSV file without storing it.
+        Returns the headers, the rows and for every column the number of cells per type"""
+        rows = []
+        for filename, line, row in self.__ReadRows ([inFilename]):
+            rows.append (row)
+        counts = []
+        sample = rows [::max (1, len (rows) // self.SAMPLE_SIZE)]
+        for i in range (len (self.headers)):
+            types = [self.__GetColType (row [i]) for row in sample]
+            counts.append (self.__CountColTypes (types))
+        return self.headers, rows, counts
 
     def __GetCsvTable(self,inCsvData):
         isHeader = True
@@ -36,59 +501,399 @@ class CsvTool:
         for row in inCsvData:
             if isHeader:
                 isHeader = False
-                self.headers = row
-                for i in range(len(self.headers)):
-                    # the following sympols are not allowed in header
-                    self.headers[i] = self.headers[i].replace(' ', '')
-                    self.headers[i] = self.headers[i].replace('/', '')
-                    self.headers[i] = self.headers[i].replace('(', '')
-                    self.headers[i] = self.headers[i].replace(')', '')
+                headers = self.__CleanHeader(row)
+                self.headers = self.__ProjectHeaders(headers)
+                if self.filter is not None:
+                    # the rows are read from the filtered rows from now on
+                    for row in self.__FilterRows(inCsvData, headers):
+                        self.__AddRow (self.__CleanRow(row))
+                        count += 1
             else:
-                # the following symbols are not allowed in data
-                #row = [cell.replace(',', '.') for cell in row] # does not work! you have manually replace the ,-symbols by .-symbols in the csv file
-                row = [cell.replace('\\', '') for cell in row]
-                row = [cell.replace('"', '') for cell in row]
-                # make sure row has correct length, otherwise fill with empty cells
-                while len(row) < len(self.headers):
-                    row.append(',')
-                self.csvTable.append(row)
+                self.__AddRow (self.__CleanRow(row))
                 count += 1
 
+    def __FilterRows(self, inCsvData, inHeaders):
+        """Yield the rows of a csv.reader which match the filter, their lines are added to self.lines.
+        The filter is compiled on the first SAMPLE_SIZE rows, see __GetRowFilter"""
+        sample = [(row, inCsvData.line_num) for row in islice (inCsvData, self.SAMPLE_SIZE)]
+        self.rowFilter = self.__GetRowFilter (inHeaders, [row for row, line in sample])
+        for row, line in chain (sample, ((row, inCsvData.line_num) for row in inCsvData)):
+            try:
+                isLoaded = self.rowFilter (row)
+            except ValueError, e:
+                logger.error ("%s in line %d. You have to correct the value in the CSV file yourself!", e, line)
+                raise ValueError ("%s in line %d" % (e, line))
+            if isLoaded:
+                self.lines.append (line)
+                yield row
+
+    def __GetRowFilter(self, inHeaders, inSample):
+        """Compile the filter to a function of a row as it is read from a CSV file with the cleaned headers inHeaders.
+        Only the cells of the columns used by the filter are cleaned and converted, to the type given by inColTypes
+        or determined on the rows of inSample, which are the first rows of the file"""
+        compiler = QueryCompiler ()
+        colTypes = {}
+        for header in compiler.GetColumns (self.filter):
+            if header not in inHeaders:
+                logger.error ("Unknown column %s in filter", header)
+                raise ValueError ("Unknown column %s in filter" % header)
+            i = inHeaders.index (header)
+            types = [self.__GetColType (row [i].replace ('\\', '').replace ('"', '')) for row in inSample if i < len (row)]
+            colTypes [header] = self.fixedColTypes.get (header) or self.__GetColTypeFromList (types)
+        predicate = compiler.BuildPredicate (self.filter, inHeaders, colTypes)
+        cells = [(inHeaders.index (header), type) for header, type in colTypes.items ()]
+        ConvertCell = self.__ConvertCell
+        
+        def IsLoaded (inRow):
+            row = [None] * len (inHeaders)
+            for i, type in cells:
+                # a missing cell is filled like __CleanRow does
+                cell = ','
+                if i < len (inRow):
+                    cell = inRow [i].replace ('\\', '').replace ('"', '')
+                if type not in NUMERIC_TYPES:
+                    row [i] = cell
+                elif cell != '':
+                    row [i] = ConvertCell (cell, type)
+            return predicate (row)
+        return IsLoaded
+
+    def __AddRow(self, inRow):
+        if self.columnar:
+            if not self.columns:
+                self.columns = [[] for header in self.headers]
+            for column, cell in izip (self.columns, inRow):
+                column.append (cell)
+        else:
+            self.csvTable.append(inRow)
+
+    def __CleanHeader(self, inRow):
+        headers = inRow
+        for i in range(len(headers)):
+            # the following sympols are not allowed in header
+            headers[i] = headers[i].replace(' ', '')
+            headers[i] = headers[i].replace('/', '')
+            headers[i] = headers[i].replace('(', '')
+            headers[i] = headers[i].replace(')', '')
+        return headers
+
+    def __ProjectHeaders(self, inHeaders):
+        """Return the cleaned headers of the loaded columns of a CSV file, see inColumns"""
+        if self.projection is None:
+            return inHeaders
+        for header in sorted (self.projection):
+            if header not in inHeaders:
+                logger.error ("Column %s is not in the CSV file", header)
+                raise ValueError ("Column %s is not in the CSV file" % header)
+        self.columnIndices = [i for i, header in enumerate (inHeaders) if header in self.projection]
+        return [inHeaders [i] for i in self.columnIndices]
+
+    def __CleanRow(self, inRow):
+        if self.projection is not None:
+            # only the cells of the loaded columns are cleaned, missing cells are filled below
+            inRow = [inRow [i] for i in self.columnIndices if i < len (inRow)]
+        # the following symbols are not allowed in data
+        #row = [cell.replace(',', '.') for cell in row] # does not work! you have manually replace the ,-symbols by .-symbols in the csv file
+        row = [cell.replace('\\', '') for cell in inRow]
+        row = [cell.replace('"', '') for cell in row]
+        # make sure row has correct length, otherwise fill with empty cells
+        while len(row) < len(self.headers):
+            row.append(',')
+        return row
+
+    def StreamFile(self, inFilename, inSampleSize=1000):
+        """Return a generator of the cleaned and typed rows of one or more CSV files, without storing the table.
+        The column types are determined on the first inSampleSize rows, which are read before this function returns.
+        Afterwards self.headers and self.colTypes are set, so queries can be compiled before the rows are consumed"""
+        if not isinstance (inFilename, list):
+            inFilename = [inFilename]
+        rows = self.__ReadRows (inFilename)
+        sample = []
+        for row in rows:
+            sample.append (row)
+            if len (sample) >= inSampleSize:
+                break
+        
+        self.colTypes = {}
+        for i, header in enumerate (self.headers):
+            colType = [self.__GetColType (row [i]) for filename, line, row in sample]
+            self.colTypes [header] = self.__GetColTypeFromList (colType)
+        self.__SetFixedColTypes ()
+        
+        return self.__TypeRows (chain (sample, rows), len (sample))
+
+    def __ReadRows(self, inFilenames):
+        """Yield the file, the line and the cleaned cells of every row of the CSV files"""
+        headerprev = None
+        for filename in inFilenames:
+            csvData = csv.reader (open (filename))
+            isHeader = True
+            for row in csvData:
+                if isHeader:
+                    isHeader = False
+                    self.headers = self.__ProjectHeaders (self.__CleanHeader (row))
+                    if headerprev and self.headers != headerprev:
+                        logger.error ("Header of CSV file %s is not the same as the previous one!", filename)
+                        raise ValueError ("Header of CSV file %s is not the same as the previous one" % filename)
+                    headerprev = self.headers
+                else:
+                    yield filename, csvData.line_num, self.__CleanRow (row)
+
+    def __TypeRows(self, inRows, inSampleSize):
+        types = [[i, self.colTypes [header]] for i, header in enumerate (self.headers) if self.colTypes [header] in NUMERIC_TYPES]
+        for j, (filename, line, row) in enumerate (inRows):
+            for column in types:
+                i, type = column
+                cell = row [i]
+                if cell is '':
+                    row [i] = None
+                    continue
+                if type == 'int' and j >= inSampleSize and not INT_PATTERN.match (cell) and self.headers [i] not in self.fixedColTypes:
+                    # a non-integral cell after the sample, the integral cells before keep their values when the column becomes float
+                    logger.warning ("Column %s is float instead of int, which was determined on a sample, from %s line %d", self.headers [i], filename, line)
+                    type = column [1] = self.colTypes [self.headers [i]] = 'float'
+                try:
+                    row [i] = self.__ConvertCell (cell, type)
+                except ValueError:
+                    logger.error ("Could not convert to %s: %s in %s line %d. You have to correct the value in the CSV file yourself!", type, str (cell), filename, line)
+                    raise ValueError ("Could not convert to %s: %s in %s line %d" % (type, str (cell), filename, line))
+            yield row
+
+    def StreamQueries(self, inFilename, inQueries):
+        """Run a list of queries on a stream of rows, see StreamFile.
+        Yields the index of the row in the stream, the typed row and the numbers of the queries matching it, for every row matching at least one query"""
+        rows = self.StreamFile (inFilename)
+        matchers = self.__GetSharedMatchers (inQueries)
+        predicates = [self.CompileQuery (query, matchers) for query in inQueries]
+        return self.__MatchRows (rows, predicates)
+
+    def __MatchRows(self, inRows, inPredicates):
+        predicates = inPredicates
+        for j, row in enumerate (inRows):
+            matches = [k for k, predicate in enumerate (predicates) if predicate (row)]
+            if matches:
+                yield j, row, matches
+
     def __SetColType (self):
+        """Determine the column types on a sample of at most SAMPLE_SIZE rows spread over the table.
+        The types are confirmed when the cells are converted, see __ConvertColumn"""
         self.colTypes = {}
-        tableTransposed = map(list, zip(*self.csvTable))
-        for i, col in enumerate (tableTransposed):
+        stride = max (1, self.GetRowCount () // self.SAMPLE_SIZE)
+        for i, header in enumerate (self.headers):
             colType = []
-            header = self.headers [i]
             
-            for elem in col:
+            for elem in islice (self.__GetRawColumn (i), 0, None, stride):
                 colType.append (self.__GetColType (elem))
             
             self.colTypes [header] = self.__GetColTypeFromList (colType)
+    
+    def __SetFixedColTypes (self):
+        for header, type in self.fixedColTypes.items ():
+            if header in self.headers:
+                self.colTypes [header] = type
+    
+    def __GetRawColumn (self, inIndex):
+        """Return the cells of a column as they were read from the CSV file, without copying the table"""
+        if self.columnar:
+            return self.columns [inIndex]
+        return (row [inIndex] for row in self.csvTable)
+    
+    def __SetRowTypes (self):
+        """Convert the cells of the numeric columns to int or float, empty cells become None"""
+        for i, header in enumerate (self.headers):
+            values = self.__ConvertColumn (i, [row [i] for row in self.csvTable])
+            if self.colTypes [header] in NUMERIC_TYPES:
+                for row, value in izip (self.csvTable, values):
+                    row [i] = value
+
+    def __SetColumns (self):
+        """Convert the columns of strings to typed columns, empty cells of numeric columns get a null value"""
+        self.nullColumns = []
+        for i, header in enumerate (self.headers):
+            # replace the strings right away, so the strings and typed values of all columns are never in memory together
+            self.columns [i] = self.__TypeColumn (i, self.columns [i])
+    
+    def __TypeColumn (self, inIndex, inCells):
+        """Convert a column of strings to a typed column as it is stored by the columnar backend, see __SetColumns"""
+        values = self.__ConvertColumn (inIndex, inCells)
+        type = self.colTypes [self.headers [inIndex]]
+        if type == 'float':
+            column = array ('d', (NULL_FLOAT if value is None else value for value in values))
+        elif type in NUMERIC_TYPES:
+            column = array ('l', (NULL_INT if value is None else value for value in values))
+        else:
+            column = [intern (str (cell)) for cell in values]
+            distinct = len (set (column))
+            if distinct <= self.MAX_DICTIONARY_SIZE and distinct * self.DICTIONARY_REPEATS <= len (column):
+                column = DictionaryColumn (column)
+        if type in NUMERIC_TYPES and None in values:
+            self.nullColumns.append (inIndex)
+        return column
+    
+    def __ConvertColumn (self, inIndex, inCells):
+        """Convert the cells of a column to the type of the column, empty cells of numeric columns become None.
+        The type was determined on a sample, when a cell cannot be converted the type is determined again on all cells of the column"""
+        header = self.headers [inIndex]
+        type = self.colTypes [header]
+        if type not in NUMERIC_TYPES:
+            return inCells
+        try:
+            # a non-integral cell of an int column fails as well, the sample may have missed the decimals
+            return self.__ConvertCells (inCells, type, 0, True)
+        except ValueError:
+            fullType = self.__GetColTypeFromList ([self.__GetColType (cell) for cell in inCells])
+            if fullType != type and header not in self.fixedColTypes:
+                logger.warning ("Column %s is %s instead of %s, which was determined on a sample", header, fullType, type)
+                self.colTypes [header] = fullType
+                return self.__ConvertColumn (inIndex, inCells)
+        # the type holds for the whole column, the few non-integral cells of an int column are truncated
+        try:
+            return self.__ConvertCells (inCells, type, 0)
+        except ValueError, e:
+            logger.error ("%s. You have to correct the value in the CSV file yourself!", e)
+            raise
+    
+    def __ConvertCells (self, inCells, inType, inFirstRow, inExact=False):
+        values = []
+        for j, cell in enumerate (inCells, inFirstRow):
+            if cell is '':
+                values.append (None)
+                continue
+            try:
+                if inExact and inType == 'int' and not INT_PATTERN.match (cell):
+                    raise ValueError ("Not an integer")
+                values.append (self.__ConvertCell (cell, inType))
+            except ValueError:
+                filename, line = self.GetSource (j)
+                raise ValueError ("Could not convert to %s: %s in %s line %d" % (inType, str (cell), filename, line))
+        return values
+    
+    def AppendRows (self, inRows, inSource='<appended>', inFirstLine=2):
+        """Append cleaned rows (lists of strings) to the loaded table, their cells are converted to the existing column types.
+        The rows start at line inFirstLine of inSource, e.g. after the rows of a file which is loaded already.
+        With inColumns the rows have all columns of the CSV files, of which only the loaded columns are appended.
+        Only the appended rows are added to the indexes. Returns the index of the first appended row"""
+        start = self.GetRowCount ()
+        self.sources.append ((inSource, start, inFirstLine))
+        if self.rowFilter is not None:
+            # the rows of a filtered load are filtered as well
+            selected = [k for k, row in enumerate (inRows) if self.rowFilter (row)]
+            self.lines.extend (k + inFirstLine for k in selected)
+            inRows = [inRows [k] for k in selected]
+        if self.projection is not None:
+            rows = [[row [i] for i in self.columnIndices] for row in inRows]
+        else:
+            rows = [list (row) for row in inRows]
+        for i, header in enumerate (self.headers):
+            type = self.colTypes [header]
+            if type not in NUMERIC_TYPES:
+                continue
+            try:
+                values = self.__ConvertCells ([row [i] for row in rows], type, start)
+            except ValueError, e:
+                logger.error ("%s. You have to correct the value in the CSV file yourself!", e)
+                raise
+            for row, value in izip (rows, values):
+                row [i] = value
+        
+        if self.columnar:
+            for i, header in enumerate (self.headers):
+                type = self.colTypes [header]
+                column = self.columns [i]
+                for row in rows:
+                    value = row [i]
+                    if value is None:
+                        column.append (NULL_FLOAT if type == 'float' else NULL_INT)
+                        if i not in self.nullColumns:
+                            self.nullColumns.append (i)
+                    elif type == 'str':
+                        column.append (intern (str (value)))
+                    else:
+                        column.append (value)
+        else:
+            self.csvTable.extend (rows)
+        
+        self.__ExtendIndexes (start)
+        return start
+    
+    def CheckRows (self, inRows, inCounts, inSource):
+        """Check that the cells of rows read by ReadFile can be converted to their column type, which is the given type
+        (see inColTypes) or the type of the counts of ReadFile. Raises a ValueError for the first cell which cannot be converted"""
+        for i, header in enumerate (self.headers):
+            type = self.fixedColTypes.get (header) or self.__GetColTypeFromCounts (inCounts [i])
+            if type not in NUMERIC_TYPES:
+                continue
+            for row in inRows:
+                cell = row [i]
+                if cell is '':
+                    continue
+                try:
+                    self.__ConvertCell (cell, type)
+                except ValueError:
+                    logger.error ("Could not convert to %s: %s in %s. You have to correct the value in the CSV file yourself!", type, str (cell), inSource)
+                    raise ValueError ("Could not convert to %s: %s in %s" % (type, str (cell), inSource))
+    
+    def __ConvertCell (self, inValue, inType):
+        """Convert a cell to a column type, raises a ValueError when this is not possible"""
+        if inType == 'float':
+            return float (inValue)
+        elif inType == 'int':
+            # first convert possible string to float, this prevents invalid literals
+            # then convert float to int
+            return int (float (inValue))
+        elif inType == 'date':
+            if DATUM_PATTERN.match (inValue):
+                return int (inValue)
+            return int (self.__ConvertDateToInt (inValue))
+        elif inType == 'cents':
+            # the nearest double of an amount with 2 decimals times 100 is less than half a cent from the exact amount
+            return int (round (float (inValue) * 100))
+        return inValue
+
+    def GetSource (self, inRow):
+        """Return the CSV file and the line in that file of a row, the first line of a file is the header"""
+        for filename, start, firstLine in reversed (self.sources):
+            if inRow >= start:
+                if self.lines is not None:
+                    return filename, self.lines [inRow]
+                return filename, inRow - start + firstLine
+        return None, None
             
     def __GetColType (self, inValue):
-        ret = 'str'
-        if inValue is not "":
-            if self.IsFloat(inValue):
-                ret = 'float'
-            elif self.IsInt(inValue):
-                ret = 'int'
-            #if self.IsDate(value):
-            #    self.csvTable[j][i] = self.__ConvertDateToInt(value)
-            #    colT = 'int'
-            #else (isFloat is False and isInt is False):
-                # remove new lines
-                #self.csvTable[j][i] = value.replace('\n', '. ')
-        return ret
+        """Classify a cell with the compiled patterns, see __GetColTypeFromCounts for the classes"""
+        if inValue is "":
+            return 'empty'
+        if DATUM_PATTERN.match (inValue):
+            return 'datum'
+        if INT_PATTERN.match (inValue):
+            return 'int'
+        if FLOAT_PATTERN.match (inValue):
+            return 'float'
+        if DATE_PATTERN.match (inValue):
+            return 'date'
+        return 'str'
         
     def __GetColTypeFromList (self, inList):
+        return self.__GetColTypeFromCounts (self.__CountColTypes (inList))
+
+    def __CountColTypes (self, inList):
+        mydict = {}
+        for colType in ('empty', 'datum', 'int', 'float', 'date', 'str'):
+            mydict [colType] = inList.count (colType)
+        return mydict
+        
+    def __GetColTypeFromCounts (self, inCounts):
+        """A column is a date column when all cells which are not empty are dates (YYYYMMDD or the format of IsDate).
+        Otherwise dates YYYYMMDD count as int, the other dates and empty cells as str and the most occurring type wins"""
+        dates = inCounts ['datum'] + inCounts ['date']
+        if dates and dates == sum (inCounts.values ()) - inCounts ['empty']:
+            return 'date'
         mydict = {
-            'str': inList.count ('str'),
-            'int': inList.count ('int'),
-            'float': inList.count ('float')
+            'str': inCounts ['str'] + inCounts ['date'] + inCounts ['empty'],
+            'int': inCounts ['int'] + inCounts ['datum'],
+            'float': inCounts ['float']
         }
         return max (mydict, key=mydict.get)
-        
     
     
     def __SetColType2(self):
@@ -119,81 +924,352 @@ class CsvTool:
             self.colType.append(colT)
           
     def RunQuery(self, inQuery):
-        outList = []
-        outIndices = []
-        for j in range(len(self.csvTable)):
-            # assign the column variables
-            for i in range(len(self.headers)):
+        """Return the rows and the indices of the rows matching the query.
+        The query is either a python expression in which the headers are the variables, or a query tree of the QueryCompiler.
+        Both are compiled once, after which they are evaluated on the typed rows"""
+        return self.RunQueries ([inQuery]) [0]
+
+    def RunQueries(self, inQueries, inFirstRow=0, inLabels=None):
+        """Run a list of queries in a single scan over the table, or over the rows from inFirstRow on.
+        Queries which can be answered by the indexes are only evaluated on the candidate rows of the indexes,
+        and not evaluated at all when the indexes answer them exactly.
+        When there are several query trees, their shared terms are evaluated once, see __EvaluateTrees.
+        inLabels names the queries for the profiler, by default the query itself.
+        Returns a list with for every query the rows and the indices of the rows matching it, like RunQuery does"""
+        evaluateStart = self.profiler.Start ()
+        outResults = [([], []) for query in inQueries]
+        if inLabels is None:
+            inLabels = [query if isinstance (query, basestring) else repr (query) for query in inQueries]
+        
+        # the queries which are not cached are run, and cached when they were run on all rows
+        missing = []
+        for query, label, (outList, outIndices) in zip (inQueries, inLabels, outResults):
+            start = time.time ()
+            key = rows = None
+            if self.queryCache:
+                key = self.__GetCacheKey (query)
+                rows = self.queryCache.Get (key)
+            if rows is None:
+                missing.append ((key, query, label, (outList, outIndices)))
+                continue
+            for j in rows:
+                if j >= inFirstRow:
+                    outList.append (self.GetRow (j))
+                    outIndices.append (j)
+            self.profiler.Count ('cacheHits')
+            self.profiler.AddQuery (label, time.time () - start, 0, len (outIndices), inCacheHit=True)
+        
+        matchers = self.__GetSharedMatchers ([query for key, query, label, out in missing])
+        trees = [(query, label, out) for key, query, label, out in missing if not isinstance (query, basestring)]
+        if len (trees) > 1:
+            bitmaps = self.__EvaluateTrees ([query for query, label, out in trees], inFirstRow, matchers, [label for query, label, out in trees])
+            for (query, label, (outList, outIndices)), bitmap in zip (trees, bitmaps):
+                for j in bitmap:
+                    outList.append (self.GetRow (j))
+                    outIndices.append (j)
+        
+        scanned = []
+        for key, query, label, (outList, outIndices) in missing:
+            if len (trees) > 1 and not isinstance (query, basestring):
+                continue
+            start = self.profiler.Start ()
+            predicate = self.__CompileScan (query, matchers)
+            self.profiler.Stop ('compile', start)
+            start = time.time ()
+            candidates, exact = self.__GetCandidates (query)
+            if candidates is None:
+                stats = {'time': 0.0, 'rowsScanned': 0}
+                scanned.append ((self.__ProfileFunction (predicate, stats), (outList, outIndices), label, stats))
+                continue
+            self.profiler.Count ('indexHits')
+            for j in sorted (candidates):
+                if j < inFirstRow:
+                    continue
+                if exact or predicate (self.__GetTypedRow (j)):
+                    outList.append (self.GetRow (j))
+                    outIndices.append (j)
+            self.profiler.AddQuery (label, time.time () - start, 0 if exact else len (candidates), len (outIndices), inIndexHit=True)
+        
+        if scanned:
+            for j, row in self.__GetTypedRows (inFirstRow):
+                for predicate, (outList, outIndices), label, stats in scanned:
+                    if predicate (row):
+                        outList.append (self.GetRow (j))
+                        outIndices.append (j)
+            self.profiler.Count ('rowsScanned', self.GetRowCount () - inFirstRow)
+            for predicate, (outList, outIndices), label, stats in scanned:
+                self.profiler.AddQuery (label, stats ['time'], stats ['rowsScanned'], len (outIndices))
+        
+        if self.queryCache and inFirstRow == 0:
+            self.profiler.Count ('cacheMisses', len (missing))
+            for key, query, label, (outList, outIndices) in missing:
+                self.queryCache.Put (key, outIndices)
+        self.profiler.Stop ('evaluate', evaluateStart)
+        return outResults
+
+    def __ProfileFunction(self, inFunction, ioStats):
+        """When profiling, wrap a function of one argument (a predicate) to add the time of every call
+        to ioStats['time'] and count the calls in ioStats['rowsScanned']"""
+        if not self.profiler.enabled:
+            return inFunction
+        def function (inArgument):
+            start = time.time ()
+            ret = inFunction (inArgument)
+            ioStats ['time'] += time.time () - start
+            ioStats ['rowsScanned'] += 1
+            return ret
+        return function
+
+    def __EvaluateTrees(self, inTrees, inFirstRow, inMatchers, inLabels):
+        """Evaluate query trees as one DAG: every distinct subtree (in canonical form) of all trees is evaluated once
+        to a Bitmap of the matching rows from inFirstRow on, which is reused by every tree containing it.
+        Leaves which are answered exactly by an index are not scanned, the other leaves are evaluated in a single scan,
+        so the cost follows the number of distinct terms instead of the number of terms of all queries.
+        For the profiler the time of a tree is the time of its leaves, a leaf shared by several trees counts for each of them.
+        Returns the Bitmap of every tree"""
+        compiler = QueryCompiler ()
+        trees = [compiler.Canonicalize (tree) for tree in inTrees]
+        leaves = set ()
+        for tree in trees:
+            self.__GetLeaves (tree, leaves)
+        
+        bitmaps = {}
+        leafStats = {}
+        scanned = []
+        # the substrings of a column with a shared automaton are all looked up in the matches of the cell at once
+        substrings = {}
+        for leaf in sorted (leaves):
+            stats = leafStats [leaf] = {'time': 0.0, 'rowsScanned': 0, 'indexHit': False}
+            start = time.time ()
+            candidates, exact = self.__GetCandidates (leaf)
+            if candidates is None and leaf [0] == 'in' and leaf [1] in inMatchers:
+                substrings.setdefault (leaf [1], {}) [leaf [2]] = []
+                continue
+            elif candidates is None:
+                compileStart = self.profiler.Start ()
+                predicate = self.__CompileScan (leaf, inMatchers)
+                self.profiler.Stop ('compile', compileStart)
+                scanned.append ((leaf, self.__ProfileFunction (predicate, stats), []))
+                continue
+            elif exact:
+                bitmaps [leaf] = Bitmap (j for j in candidates if j >= inFirstRow)
+            else:
+                predicate = self.__CompileScan (leaf, inMatchers)
+                bitmaps [leaf] = Bitmap (j for j in candidates if j >= inFirstRow and predicate (self.__GetTypedRow (j)))
+                stats ['rowsScanned'] = len (candidates)
+            stats ['time'] = time.time () - start
+            stats ['indexHit'] = True
+            self.profiler.Count ('indexHits')
+        if scanned or substrings:
+            matched = []
+            dictionaries = self.__GetDictionaries ()
+            for header, rowsOfSubstring in substrings.items ():
+                stats = {'time': 0.0, 'rowsScanned': 0}
+                FindAll = inMatchers [header].FindAll
+                if header in dictionaries:
+                    # the cells are codes, the substrings of every distinct value are found once
+                    FindAll = map (FindAll, dictionaries [header].values).__getitem__
+                matched.append ((self.headers.index (header), self.__ProfileFunction (FindAll, stats), rowsOfSubstring, stats))
+            for j, row in self.__GetTypedRows (inFirstRow):
+                for leaf, predicate, rows in scanned:
+                    if predicate (row):
+                        rows.append (j)
+                for i, FindAll, rowsOfSubstring, stats in matched:
+                    for substring in FindAll (row [i]):
+                        if substring in rowsOfSubstring:
+                            rowsOfSubstring [substring].append (j)
+            self.profiler.Count ('rowsScanned', self.GetRowCount () - inFirstRow)
+            for leaf, predicate, rows in scanned:
+                bitmaps [leaf] = Bitmap (rows)
+            for i, FindAll, rowsOfSubstring, stats in matched:
                 header = self.headers [i]
-                value  = self.csvTable[j][i]
-                type  = self.colTypes[header]
-                forceFalseResult = False
-                
-                if value is '':
-                    # if no value is supplied while the other values in the same column are identified as float or int, then force a False result
-                    if type == 'float' or type == 'int':
-                        forceFalseResult = True
-                    else:
-                        type = 'str'
-                        value = str (value)
-                elif type == 'float':
-                    # make sure it is a float
-                    try:
-                        value = str (float (value))
-                    except ValueError:
-                        logger.error ("Could not convert to float: %s. You have to correct the value in the CSV file yourself!", str (value))
-                        print self.csvTable[j]
-                        assert (False)
-                elif type == 'int':
-                    # make sure it is an int:
-                    # first convert possible string to float, this prevents invalid literals
-                    # then convert float to int
-                    try:
-                        value = str (int (float (value)))
-                    except ValueError:
-                        logger.error ("Could not convert to integer: %s. You have to correct the value in the CSV file yourself!", str (value))
-                        print self.csvTable[j]
-                        assert (False)
-                else:
-                    # Everything else should be string
-                    value = str (value)
-                
-                # run statement to see if it is true
-                if not forceFalseResult:
-                    exec (header + '=' + type + '("' + value + '")')
+                for substring, rows in rowsOfSubstring.items ():
+                    bitmaps [('in', header, substring)] = Bitmap (rows)
+                    # the automaton scans the column once for all its substrings, which share its time
+                    leafStats [('in', header, substring)].update (time=stats ['time'] / len (rowsOfSubstring), rowsScanned=stats ['rowsScanned'])
+        
+        ret = [self.__EvaluateNode (tree, bitmaps, inFirstRow) for tree in trees]
+        if self.profiler.enabled:
+            for tree, label, bitmap in zip (trees, inLabels, ret):
+                leaves = set ()
+                self.__GetLeaves (tree, leaves)
+                stats = [leafStats [leaf] for leaf in leaves]
+                # the leaves share one scan, so the query looked at the rows of its widest leaf
+                self.profiler.AddQuery (label, sum (leaf ['time'] for leaf in stats), max (leaf ['rowsScanned'] for leaf in stats),
+                                        len (bitmap), any (leaf ['indexHit'] for leaf in stats))
+        return ret
+
+    def __GetLeaves(self, inTree, outLeaves):
+        if inTree [0] in ('and', 'or'):
+            for child in inTree [1]:
+                self.__GetLeaves (child, outLeaves)
+        else:
+            outLeaves.add (inTree)
+
+    def __EvaluateNode(self, inNode, ioBitmaps, inFirstRow):
+        """Return the Bitmap of a node of the DAG, the Bitmaps of the nodes are kept in ioBitmaps"""
+        bitmap = ioBitmaps.get (inNode)
+        if bitmap is not None:
+            return bitmap
+        operator, children = inNode
+        bitmaps = [self.__EvaluateNode (child, ioBitmaps, inFirstRow) for child in children]
+        if operator == 'and':
+            if not bitmaps:
+                # an empty and is true for all rows
+                bitmaps = [Bitmap (xrange (inFirstRow, self.GetRowCount ()))]
+            bitmap = bitmaps [0]
+            for other in bitmaps [1:]:
+                bitmap = bitmap & other
+        else:
+            bitmap = Bitmap ()
+            for other in bitmaps:
+                bitmap = bitmap | other
+        ioBitmaps [inNode] = bitmap
+        return bitmap
+
+    def __GetCacheKey(self, inQuery):
+        if isinstance (inQuery, basestring):
+            return (self.fingerprint, inQuery.strip ())
+        return (self.fingerprint, QueryCompiler ().Canonicalize (inQuery, self.colTypes))
+
+    def __GetCandidates(self, inQuery):
+        """Plan a query on the indexes.
+        Returns the set of rows which may match the query, or None when all rows have to be checked,
+        and whether the set contains exactly the matching rows"""
+        if isinstance (inQuery, basestring):
+            return None, False
+        operator = inQuery [0]
+        if operator == 'and':
+            sets = []
+            exact = True
+            # the range terms of a column with a sorted index are combined into one slice of the index
+            ranges = {}
+            for child in inQuery [1]:
+                if child [0] in QueryCompiler.RANGE_OPERATORS and child [1] in self.sortedIndexes:
+                    value = QueryCompiler ().ConvertValue (child [2], self.colTypes [child [1]])
+                    ranges.setdefault (child [1], []).append ((child [0], value))
+                    continue
+                rows, childExact = self.__GetCandidates (child)
+                if rows is None:
+                    exact = False
                 else:
-                    exec ('False')
-                
-                # write back changes
-                self.csvTable[j][i] = value    
-                        
-            # output the rows matching the query
-            if eval(inQuery):
-                outList.append (self.csvTable[j])
-                outIndices.append (j)
-    
-        return outList, outIndices
+                    sets.append (rows)
+                    exact = exact and childExact
+            for header, terms in ranges.items ():
+                sets.append (self.sortedIndexes [header].GetRows (terms))
+            if not sets:
+                return None, False
+            # intersect starting with the smallest set
+            sets.sort (key=len)
+            candidates = set (sets [0])
+            for rows in sets [1:]:
+                candidates.intersection_update (rows)
+            return candidates, exact
+        elif operator == 'or':
+            candidates = set ()
+            exact = True
+            for child in inQuery [1]:
+                rows, childExact = self.__GetCandidates (child)
+                if rows is None:
+                    return None, False
+                candidates.update (rows)
+                exact = exact and childExact
+            return candidates, exact
+        elif operator == '==' and inQuery [1] in self.headers and self.GetHashIndex (inQuery [1]) is not None:
+            header = inQuery [1]
+            value = QueryCompiler ().ConvertValue (inQuery [2], self.colTypes [header])
+            return self.GetHashIndex (header).GetRows (value), True
+        elif operator in QueryCompiler.RANGE_OPERATORS and inQuery [1] in self.sortedIndexes:
+            header = inQuery [1]
+            value = QueryCompiler ().ConvertValue (inQuery [2], self.colTypes [header])
+            return self.sortedIndexes [header].GetRows ([(operator, value)]), True
+        elif operator == 'in' and inQuery [1] in self.textIndexes:
+            return self.textIndexes [inQuery [1]].GetCandidates (inQuery [2]), False
+        return None, False
+
+    def CompileQuery(self, inQuery, inMatchers=None):
+        """Compile a query to a function which evaluates a typed row (see GetRow), see QueryCompiler.BuildPredicate for inMatchers"""
+        return self.__CompileQuery (inQuery, inMatchers, {})
+
+    def __CompileScan(self, inQuery, inMatchers):
+        """Compile a query to a function which evaluates a row of __GetTypedRows, in which the cells of dictionary-encoded columns are codes"""
+        return self.__CompileQuery (inQuery, inMatchers, self.__GetDictionaries ())
+
+    def __CompileQuery(self, inQuery, inMatchers, inDictionaries):
+        if isinstance (inQuery, basestring):
+            code = compile (inQuery, '<query>', 'eval')
+            headers = self.headers
+            dictionaries = [(self.headers.index (header), column.values) for header, column in inDictionaries.items ()]
+            def predicate (row):
+                if dictionaries:
+                    # the typed rows hold the codes of dictionary-encoded columns
+                    row = list (row)
+                    for i, values in dictionaries:
+                        row [i] = values [row [i]]
+                # if no value is supplied while the other values in the same column are identified as float or int, then force a False result
+                variables = dict (zip (headers, [MISSING if value is None else value for value in row]))
+                return eval (code, {}, variables)
+            return predicate
+        return QueryCompiler ().BuildPredicate (inQuery, self.headers, self.colTypes, inMatchers, inDictionaries)
+
+    def __GetDictionaries(self):
+        """Return a dict from header to the DictionaryColumn of the dictionary-encoded columns"""
+        return dict ((header, column) for header, column in zip (self.headers, self.columns) if isinstance (column, DictionaryColumn))
+
+    def __GetSharedMatchers(self, inQueries):
+        """Build one AhoCorasick automaton per string column for all substrings of the query trees on that column.
+        Only columns with at least QueryCompiler.MIN_AUTOMATON_PATTERNS substrings get one"""
+        compiler = QueryCompiler ()
+        substrings = {}
+        for query in inQueries:
+            if not isinstance (query, basestring):
+                compiler.GetSubstrings (query, substrings)
+        matchers = {}
+        for header, patterns in substrings.items ():
+            if self.colTypes.get (header) == 'str' and len (patterns) >= compiler.MIN_AUTOMATON_PATTERNS:
+                matchers [header] = AhoCorasick (patterns)
+        return matchers
+
+    def __GetTypedRows(self, inFirstRow=0):
+        """Yield the index and the typed values of every row from inFirstRow on, which are evaluated by CompileQuery.
+        The cells of dictionary-encoded columns are their codes"""
+        if self.columnar:
+            columns = [islice (self.__GetCodes (column), inFirstRow, None) for column in self.columns]
+            for j, row in enumerate (izip (*columns), inFirstRow):
+                if self.nullColumns:
+                    row = list (row)
+                    for i in self.nullColumns:
+                        if self.__IsNull (row [i]):
+                            row [i] = None
+                yield j, row
+        else:
+            for j, row in enumerate (islice (self.csvTable, inFirstRow, None), inFirstRow):
+                yield j, row
+
+    def __GetTypedRow(self, inIndex):
+        """Return the typed values of a row like __GetTypedRows does"""
+        if not self.columnar:
+            return self.csvTable [inIndex]
+        row = [self.__GetCodes (column) [inIndex] for column in self.columns]
+        for i in self.nullColumns:
+            if self.__IsNull (row [i]):
+                row [i] = None
+        return row
+
+    def __GetCodes(self, inColumn):
+        if isinstance (inColumn, DictionaryColumn):
+            return inColumn.codes
+        return inColumn
 
     def IsFloat(self, inValue):
-        ret = False
-        if not self.IsInt(inValue):
-            try:
-                if isinstance(float(inValue), float):
-                    ret = True
-            except ValueError:
-                pass
-        return ret
+        return not self.IsInt(inValue) and FLOAT_PATTERN.match(inValue) is not None
     
     def IsInt(self, inValue):
-        ret = False
-        try:
-            if isinstance(int(inValue), int):
-                ret = True
-        except ValueError:
-            pass
-        return ret
+        return INT_PATTERN.match(inValue) is not None
         
     def IsDate(self, inValue):
+        if not DATE_PATTERN.match(inValue):
+            return False
         try:
             datetime.datetime.strptime(inValue, '%b %d, %Y')
             return True
@@ -208,11 +1284,125 @@ class CsvTool:
     def GetHeaderNames(self):
         return self.headers
 
+    def GetRowCount(self):
+        if self.columnar:
+            if self.columns:
+                return len(self.columns[0])
+            return 0
+        return len(self.csvTable)
+
+    def GetRow(self, inIndex):
+        """Return a row of the table as a list of typed values, for the columnar backend the row is built from the columns"""
+        if not self.columnar:
+            return self.csvTable[inIndex]
+        row = []
+        for column in self.columns:
+            value = column[inIndex]
+            if self.__IsNull(value):
+                row.append(None)
+            else:
+                row.append(value)
+        return row
+
+    def GetColumn(self, inHeader, inFirstRow=0):
+        """Return the cells of a column, for the columnar backend this is the stored column itself.
+        With inFirstRow only the cells from that row on are returned, in a new list or array"""
+        index = self.headers.index(inHeader)
+        if self.columnar:
+            column = self.columns[index]
+            if not inFirstRow:
+                return column
+            if isinstance(column, DictionaryColumn):
+                return column.GetValues(inFirstRow)
+            return column[inFirstRow:]
+        return [row[index] for row in islice(self.csvTable, inFirstRow, None)]
+
+    def CreateTextIndex(self, inHeader):
+        """Build a TrigramIndex on a string column, which is used for the substring ('in') terms of query trees"""
+        if self.colTypes[inHeader] != 'str':
+            logger.error ("Column %s is not a string column, it cannot get a text index", inHeader)
+            raise ValueError ("Column %s is not a string column" % inHeader)
+        self.textIndexes[inHeader] = TrigramIndex(self.GetColumn(inHeader))
+
+    def CreateSortedIndex(self, inHeader):
+        """Build a SortedIndex on a numeric or date column, which is used for the range terms of query trees"""
+        if self.colTypes[inHeader] not in NUMERIC_TYPES:
+            logger.error ("Column %s is not a numeric column, it cannot get a sorted index", inHeader)
+            raise ValueError ("Column %s is not a numeric column" % inHeader)
+        self.sortedIndexes[inHeader] = SortedIndex(self.GetColumn(inHeader), NULL_INT)
+
+    def GetHashIndex(self, inHeader):
+        """Return the HashIndex of a column, it is built the first time it is needed.
+        Returns None for a column with too many distinct values, like Mededelingen, of which the index would be about
+        as large as the column itself, see MAX_DICTIONARY_SIZE and DICTIONARY_REPEATS. Its equality terms are scanned"""
+        if inHeader not in self.hashIndexes:
+            column = self.GetColumn(inHeader)
+            if isinstance(column, DictionaryColumn):
+                distinct = len(column.values)
+            else:
+                distinct = len(set(column))
+            if distinct <= self.MAX_DICTIONARY_SIZE and distinct * self.DICTIONARY_REPEATS <= len(column):
+                self.hashIndexes[inHeader] = HashIndex(column)
+            else:
+                self.hashIndexes[inHeader] = None
+        return self.hashIndexes[inHeader]
+
+    def GetBuckets(self, inHeader, inPeriod):
+        """Return the bucket of every row of a date column for the period 'year', 'quarter', 'month' or 'week'.
+        The buckets are ints, e.g. 2013, 20131 (quarter 1), 201301 (January) or 201301 (ISO week 1), None for an empty date.
+        They are computed once for all rows, the first time they are needed"""
+        if (inHeader, inPeriod) in self.buckets:
+            return self.buckets[(inHeader, inPeriod)]
+        if self.colTypes[inHeader] != 'date':
+            logger.error ("Column %s is not a date column, it cannot be grouped by %s", inHeader, inPeriod)
+            raise ValueError ("Column %s is not a date column" % inHeader)
+        buckets = self.__GetBuckets(self.GetColumn(inHeader), inPeriod)
+        self.buckets[(inHeader, inPeriod)] = buckets
+        return buckets
+
+    def __GetBuckets(self, inDates, inPeriod):
+        """Return the bucket of every date of a list for a period, see GetBuckets"""
+        if inPeriod == 'year':
+            GetBucket = lambda date: date.year
+        elif inPeriod == 'quarter':
+            GetBucket = lambda date: date.year * 10 + (date.month + 2) // 3
+        elif inPeriod == 'month':
+            GetBucket = lambda date: date.year * 100 + date.month
+        elif inPeriod == 'week':
+            GetBucket = lambda date: date.isocalendar()[0] * 100 + date.isocalendar()[1]
+        else:
+            logger.error ("Unknown period %s", inPeriod)
+            raise ValueError ("Unknown period %s" % inPeriod)
+        
+        # a table has few distinct dates, so every date is converted once
+        bucketOfDate = {}
+        buckets = []
+        for value in inDates:
+            bucket = bucketOfDate.get(value)
+            if bucket is None and value not in bucketOfDate:
+                if value is None or self.__IsNull(value):
+                    bucket = None
+                else:
+                    bucket = GetBucket(datetime.date(value // 10000, value // 100 % 100, value % 100))
+                bucketOfDate[value] = bucket
+            buckets.append(bucket)
+        return buckets
+
     def GetUnique(self,inString):
         index=self.headers.index(inString)
         labels=set()
-        for j in range(len(self.csvTable)):
-            label=self.csvTable[j][index]
-            if label not in labels and "," not in label and label is not "":
-                labels.add(label)
+        if self.columnar:
+            cells = (value for value in set(self.columns[index]) if not self.__IsNull(value))
+        else:
+            cells = (row[index] for row in self.csvTable)
+        for label in cells:
+            if label is None or label in labels:
+                continue
+            if isinstance(label, basestring) and ("," in label or label is ""):
+                continue
+            labels.add(label)
         return labels
+
+    def __IsNull(self, inValue):
+        # NULL_FLOAT is not equal to itself
+        return inValue != inValue or inValue == NULL_INT
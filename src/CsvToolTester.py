@@ -1,5 +1,8 @@
 #!/usr/bin/env python
 from CsvTool import CsvTool
+from DictionaryColumn import DictionaryColumn
+from QueryCache import QueryCache
+from QueryCompiler import QueryCompiler
 import unittest
 import csv
 import os
@@ -72,18 +75,18 @@ class TestLoadCsvFile(unittest.TestCase):
         
         query = 'Int == 1'
         result, ind = self.d.RunQuery(query)
-        self.assertEqual('1', result[0][idx])
+        self.assertEqual(1, result[0][idx])
         
         query = 'Int < 1'
         result, ind = self.d.RunQuery(query)
-        self.assertEqual('-5', result[0][idx])
+        self.assertEqual(-5, result[0][idx])
         
         query = 'Int > 1'
         result, ind = self.d.RunQuery(query)
         ints = []
         for i in range(len(result)):
             ints.append(result[i][idx])
-        self.assertEqual(['2','2','4','6','6'], ints)
+        self.assertEqual([2,2,4,6,6], ints)
     
     def testFloat(self):
         """It should be possible to do query operations on Floats"""
@@ -91,22 +94,22 @@ class TestLoadCsvFile(unittest.TestCase):
     
         query = 'Float == 0.10'
         result, ind = self.d.RunQuery(query)
-        self.assertEqual('0.1', result[0][idx])
+        self.assertEqual(0.1, result[0][idx])
     
         query = 'Float == 1.0'
         result, ind = self.d.RunQuery(query)
-        self.assertEqual('1.0', result[0][idx])
+        self.assertEqual(1.0, result[0][idx])
         
         query = 'Float < 0'
         result, ind = self.d.RunQuery(query)
-        self.assertEqual('-1.5', result[0][idx])
+        self.assertEqual(-1.5, result[0][idx])
     
         query = 'Float >= 4.3'
         result, ind = self.d.RunQuery(query)
         floats = []
         for i in range(len(result)):
             floats.append(result[i][idx])
-        self.assertEqual(['4.3','7.1'], floats)
+        self.assertEqual([4.3,7.1], floats)
     
     def testString(self):
         """It should be possible to do query operations on Strings"""
@@ -131,6 +134,285 @@ class TestLoadCsvFile(unittest.TestCase):
         result, ind = self.d.RunQuery(query)
         self.assertEqual('Doei!', result[0][idx])
         
+    def testQueryTree(self):
+        """A query tree of the QueryCompiler should give the same results as the python expression"""
+        query = '(String == "Hallo" or "!" in String) and Int > 1'
+        expected = self.d.RunQuery(query)
+        
+        tree = ('and', (('or', (('==', 'String', 'Hallo'), ('in', 'String', '!'))), ('or', (('==', 'Int', '2'), ('==', 'Int', '4'), ('==', 'Int', '6')))))
+        actual = self.d.RunQuery(tree)
+        self.assertEqual(expected, actual)
+        self.assertEqual([2, 3, 5], actual[1])
+    
+    def testLoadTypes(self):
+        """The cells should be converted to their column type when the file is loaded, not when a query is run"""
+        row = self.d.GetRow(6)
+        self.assertEqual([6, None, 'Lol', '1'], row[:4])
+        self.d.RunQuery('Int > 1')
+        self.assertEqual(row, self.d.GetRow(6))
+    
+    def testBadNumber(self):
+        """A cell which cannot be converted to the type of its column should be reported with file and line"""
+        d = CsvTool()
+        try:
+            d.LoadFile(['test/unittest.csv', 'test/badnumber.csv'])
+            self.fail('ValueError not raised')
+        except ValueError, e:
+            self.assertEqual('Could not convert to float: 1,5 in test/badnumber.csv line 3', str(e))
+    
+    def testRunQueries(self):
+        """Running several queries in one scan should give the same results as running them one by one"""
+        queries = ['Int == 1 or Int == 2 ', '"!" in String', ('==', 'String', 'Hallo')]
+        expected = [self.d.RunQuery(query) for query in queries]
+        actual = self.d.RunQueries(queries)
+        self.assertEqual(expected, actual)
+    
+    def testSharedTerms(self):
+        """Query trees sharing terms should give the same results as running them one by one"""
+        trees = [('and', (('==', 'String', 'Hallo'), ('or', (('==', 'Int', '2'), ('in', 'String', 'al'))))),
+                 ('and', (('or', (('in', 'String', 'al'), ('==', 'Int', '2'))), ('==', 'String', 'Hallo'))),
+                 ('or', (('==', 'String', 'Hallo'), ('and', ()), ('>', 'Float', '1'))),
+                 ('and', (('>', 'Float', '1'), ('in', 'String', 'o'))),
+                 ('or', ())]
+        expected = [self.d.RunQuery(tree) for tree in trees]
+        self.assertEqual(expected, self.d.RunQueries(trees))
+        self.assertEqual([0, 2, 3], expected[0][1])
+        self.assertEqual([[2, 3], [2, 3], [2, 3, 4, 5, 6], [2, 3], []], [ind for result, ind in self.d.RunQueries(trees, 2)])
+    
+    def testStreamFile(self):
+        """Streaming a file should yield the same typed rows as loading it"""
+        d = CsvTool()
+        rows = d.StreamFile('test/unittest.csv')
+        self.assertEqual(self.d.colTypes, d.colTypes)
+        self.assertEqual([self.d.GetRow(j) for j in range(self.d.GetRowCount())], list(rows))
+        self.assertEqual([], d.csvTable)
+        
+    def testStreamQueries(self):
+        """Streaming queries should yield the rows matching at least one query together with the queries they match"""
+        d = CsvTool()
+        rows = d.StreamQueries('test/unittest.csv', ['Int == 2', '"Hallo" in String'])
+        expected = [(0, 'Hallo', [1]), (1, 'Zout', [0]), (2, 'Hallo', [0, 1]), (3, 'Hallo', [1])]
+        self.assertEqual(expected, [(j, row[2], matches) for j, row, matches in rows])
+        
+    def testHashIndex(self):
+        """Equality terms of a query tree should be answered by a hash index which is built on demand"""
+        self.assertEqual({}, self.d.hashIndexes)
+        # the columns of the small test table have few repeated values
+        self.d.DICTIONARY_REPEATS = 1
+        tree = ('and', (('==', 'Int', '6'), ('or', (('==', 'String', 'Lol'), ('==', 'String', 'Zout')))))
+        result, ind = self.d.RunQuery(tree)
+        self.assertEqual([6], ind)
+        self.assertEqual(['Int', 'String'], sorted(self.d.hashIndexes.keys()))
+        self.assertEqual([5, 6], list(self.d.GetHashIndex('Int').GetRows(6)))
+        self.assertEqual([], self.d.RunQuery(('==', 'Int', '1.5'))[1])
+        self.assertEqual([], self.d.RunQuery('Int == 1.5')[1])
+        self.assertEqual([0], self.d.RunQuery(('==', 'Int', '1.0'))[1])
+    
+    def testHashIndexCardinality(self):
+        """No hash index should be built on a column with many distinct values, its equality terms should be scanned"""
+        tree = ('or', (('==', 'String', 'Lol'), ('==', 'String', 'Zout')))
+        self.assertEqual([1, 6], self.d.RunQuery(tree)[1])
+        self.assertEqual(None, self.d.GetHashIndex('String'))
+        self.assertEqual({'String': None}, self.d.hashIndexes)
+    
+    def testSortedIndex(self):
+        """Range terms on columns with a sorted index should give the same rows as a scan"""
+        trees = [('>', 'Int', '2'), ('and', (('>=', 'Int', '2'), ('<', 'Int', '6'), ('==', 'String', 'Hallo'))),
+                 ('or', (('<', 'Float', '0'), ('>', 'Float', '1')))]
+        expected = self.d.RunQueries(trees)
+        d = CsvTool(self.d.columnar, inSortedIndexes=['Int', 'Float'])
+        d.LoadFile('test/unittest.csv')
+        self.assertEqual(['Float', 'Int'], sorted(d.sortedIndexes.keys()))
+        self.assertEqual(expected, d.RunQueries(trees))
+        self.assertEqual([2, 3], expected[1][1])
+        self.assertRaises(ValueError, d.CreateSortedIndex, 'String')
+    
+    def testNonIntegralRange(self):
+        """Range terms with a non-integral value on an int column should not be truncated, with or without a sorted index"""
+        trees = [('<', 'Int', '1.5'), ('>=', 'Int', '1.5'), ('and', (('>', 'Int', '-5.5'), ('<=', 'Int', '3.9')))]
+        expected = [[0, 4], [1, 2, 3, 5, 6], [0, 1, 2, 4]]
+        self.assertEqual(expected, [ind for result, ind in self.d.RunQueries(trees)])
+        self.assertEqual([0, 4], self.d.RunQuery('Int < 1.5')[1])
+        d = CsvTool(self.d.columnar, inSortedIndexes=['Int'])
+        d.LoadFile('test/unittest.csv')
+        self.assertEqual(expected, [ind for result, ind in d.RunQueries(trees)])
+    
+    def testQueryCache(self):
+        """Cached queries should give the same results, until the table changes"""
+        d = CsvTool(self.d.columnar, inQueryCache=QueryCache())
+        d.LoadFile('test/unittest.csv')
+        queries = [('==', 'Int', '2'), 'Float > 1', ('or', (('==', 'Int', '2.0'),))]
+        expected = self.d.RunQueries(queries)
+        self.assertEqual(expected, d.RunQueries(queries))
+        self.assertEqual(expected, d.RunQueries(queries))
+        self.assertEqual((3, 3), (d.queryCache.hits, d.queryCache.misses))
+        
+        d.AppendRows([['2', '', 'Peper', '1', ',']])
+        self.assertEqual([1, 2, 7], d.RunQuery(('==', 'Int', '2'))[1])
+        self.assertEqual([7], d.RunQueries([('==', 'Int', '2')], 7)[0][1])
+    
+    def testSharedMatcher(self):
+        """Queries sharing one automaton for their substrings should give the same results"""
+        queries = [('in', 'String', 'al'), ('or', (('in', 'String', 'Do'), ('in', 'String', 'ol'), ('in', 'String', 'Zo'))), ('==', 'String', 'Zout')]
+        expected = self.d.RunQueries(queries)
+        QueryCompiler.MIN_AUTOMATON_PATTERNS = 2
+        try:
+            actual = self.d.RunQueries(queries)
+        finally:
+            QueryCompiler.MIN_AUTOMATON_PATTERNS = 128
+        self.assertEqual(expected, actual)
+        self.assertEqual([1, 5, 6], actual[1][1])
+    
+    def testLoadFileParallel(self):
+        """Loading files in worker processes should give the same table as loading them one by one"""
+        files = ['test/first.csv', 'test/second.csv', 'test/first.csv']
+        expected = CsvTool(self.d.columnar)
+        expected.LoadFile(files)
+        actual = CsvTool(self.d.columnar)
+        actual.LoadFile(files, 2)
+        self.assertEqual(expected.headers, actual.headers)
+        self.assertEqual(expected.colTypes, actual.colTypes)
+        self.assertEqual(expected.sources, actual.sources)
+        self.assertEqual([expected.GetRow(j) for j in range(expected.GetRowCount())], [actual.GetRow(j) for j in range(actual.GetRowCount())])
+        
+        self.assertRaises(ValueError, CsvTool().LoadFile, ['test/first.csv', 'test/unittest.csv'], 2)
+    
+    def testAppendRows(self):
+        """Appended rows should be converted to the column types and be found by queries on the new rows"""
+        start = self.d.AppendRows([['6', '', 'Peper', '1', ','], ['7', '2.5', 'Lol', 'x', ',']])
+        self.assertEqual(7, start)
+        self.assertEqual([6, None, 'Peper', '1', ','], self.d.GetRow(7))
+        result, ind = self.d.RunQuery(('==', 'Int', '6'))
+        self.assertEqual([5, 6, 7], ind)
+        self.assertEqual([[7, 8]], [ind for result, ind in self.d.RunQueries(['Int > 5'], start)])
+    
+    def testAppendIndexes(self):
+        """The indexes extended with appended rows should give the same rows as indexes built on the whole table"""
+        rows = [['6', '', 'Peper', '1', ','], ['0', '2.5', 'Hallootje', 'x', ','], ['4', '', 'Lol', '', ',']]
+        trees = [('in', 'String', 'allo'), ('and', (('>=', 'Int', '2'), ('<', 'Float', '5'))), ('==', 'String', 'Lol'), ('==', 'Int', '4')]
+        d = CsvTool(self.d.columnar, inTextIndexes=['String'], inSortedIndexes=['Int', 'Float'])
+        d.LoadFile('test/unittest.csv')
+        d.DICTIONARY_REPEATS = 1
+        d.RunQueries(trees)
+        d.AppendRows(rows, 'rows.csv', 9)
+        self.assertEqual(('rows.csv', 10), d.GetSource(8))
+        expected = CsvTool(self.d.columnar)
+        expected.LoadFile('test/unittest.csv')
+        expected.AppendRows(rows)
+        self.assertEqual(expected.RunQueries(trees), d.RunQueries(trees))
+        self.assertEqual([0, 2, 3, 8], d.textIndexes['String'].Search('allo'))
+        self.assertEqual([4, 8, 0, 1, 2, 3, 9, 5, 6, 7], list(d.sortedIndexes['Int'].rows))
+        self.assertEqual([3, 9], list(d.GetHashIndex('Int').GetRows(4)))
+    
+    def testEmptyNumber(self):
+        """An empty cell in a numeric column should never match a query"""
+        query = 'Float < 0'
+        result, ind = self.d.RunQuery(query)
+        self.assertEqual([4], ind)
+    
+    def testDateColumn(self):
+        """A column of which all cells are dates should be stored as int YYYYMMDD"""
+        d = CsvTool(self.d.columnar)
+        d.LoadFile('test/first.csv')
+        self.assertEqual('date', d.colTypes['Datum'])
+        self.assertEqual(20130105, d.GetRow(1)[0])
+        result, ind = d.RunQuery(('==', 'Datum', '20130105'))
+        self.assertEqual([1], ind)
+    
+    def testSampleType(self):
+        """When the type determined on a sample is wrong, the type should be determined on the whole column"""
+        d = CsvTool(self.d.columnar)
+        d.SAMPLE_SIZE = 3
+        d.LoadFile('test/sampling.csv')
+        self.assertEqual({'Number': 'int', 'Text': 'str'}, d.colTypes)
+        self.assertEqual([2, 'a'], d.GetRow(1))
+    
+    def testSampleFloat(self):
+        """When the sample of a float column has only integral values, the decimals of the other cells should not be truncated"""
+        d = CsvTool(self.d.columnar)
+        d.SAMPLE_SIZE = 3
+        d.LoadFile('test/sampling_float.csv')
+        self.assertEqual({'Number': 'int', 'Amount': 'float'}, d.colTypes)
+        self.assertEqual([2, 2.5], d.GetRow(1))
+        d = CsvTool()
+        rows = list(d.StreamFile('test/sampling_float.csv', inSampleSize=1))
+        self.assertEqual('float', d.colTypes['Amount'])
+        self.assertEqual([1, 2.5, 3.5, 4, 5.5, 6.5, 7, 8.5, 9.5], [row[1] for row in rows])
+    
+    def testGetBuckets(self):
+        """The buckets of a date column should be computed once for every period"""
+        d = CsvTool(self.d.columnar)
+        d.LoadFile('test/first.csv')
+        self.assertEqual([2013] * 7, d.GetBuckets('Datum', 'year'))
+        self.assertEqual([20131, 20131, 20131, 20131, 20131, 20131, 20132], d.GetBuckets('Datum', 'quarter'))
+        self.assertEqual([201301, 201301, 201301, 201302, 201302, 201303, 201304], d.GetBuckets('Datum', 'month'))
+        self.assertEqual([201301, 201301, 201302, 201305, 201306, 201309, 201314], d.GetBuckets('Datum', 'week'))
+        self.assertTrue(d.GetBuckets('Datum', 'month') is d.GetBuckets('Datum', 'month'))
+        self.assertRaises(ValueError, d.GetBuckets, 'Code', 'month')
+        self.assertRaises(ValueError, d.GetBuckets, 'Datum', 'day')
+    
+    def testCentsColumn(self):
+        """A column with the given type cents should be stored as integer cents"""
+        d = CsvTool(self.d.columnar, inColTypes={'BedragEUR': 'cents'})
+        d.LoadFile(['test/first.csv', 'test/second.csv'])
+        self.assertEqual('cents', d.colTypes['BedragEUR'])
+        self.assertEqual([45540, 1174, 891, 2000], list(d.GetColumn('BedragEUR'))[:4])
+        result, ind = d.RunQuery(('==', 'BedragEUR', '8.91'))
+        self.assertEqual([2], ind)
+        # a value between two cents is not rounded
+        self.assertEqual(d.RunQuery(('>=', 'BedragEUR', '11.74'))[1], d.RunQuery(('>', 'BedragEUR', '11.735'))[1])
+        self.assertTrue(1 in d.RunQuery(('>', 'BedragEUR', '11.735'))[1])
+        self.assertEqual([], d.RunQuery(('==', 'BedragEUR', '11.738'))[1])
+        self.assertEqual([1], d.RunQuery(('==', 'BedragEUR', '11.740'))[1])
+        # a substring is searched in the amount in euros
+        self.assertEqual([1], d.RunQuery(('in', 'BedragEUR', '11.7'))[1])
+        self.assertRaises(ValueError, CsvTool(inColTypes={'Float': 'cents', 'String': 'cents'}).LoadFile, 'test/unittest.csv')
+    
+    def testProjection(self):
+        """With inColumns only these columns should be loaded, the queries on them should give the same rows"""
+        files = ['test/first.csv', 'test/second.csv']
+        expected = CsvTool(self.d.columnar)
+        expected.LoadFile(files)
+        query = ('and', (('==', 'AfBij', 'Af'), ('in', 'MutatieSoort', 'automaat')))
+        for processes in [None, 2]:
+            d = CsvTool(self.d.columnar, inColumns=['MutatieSoort', 'AfBij'])
+            d.LoadFile(files, processes)
+            self.assertEqual(['AfBij', 'MutatieSoort'], d.headers)
+            self.assertEqual({'AfBij': 'str', 'MutatieSoort': 'str'}, d.colTypes)
+            self.assertEqual(expected.RunQuery(query)[1], d.RunQuery(query)[1])
+        self.assertEqual(['Bij', 'Overschrijving'], d.GetRow(0))
+        self.assertRaises(ValueError, d.RunQuery, ('==', 'Code', 'BA'))
+        
+        d.AppendRows([['20140501', '', '', '', 'XX', 'Af', '1', 'Betaalautomaat', '']])
+        self.assertEqual(['Af', 'Betaalautomaat'], d.GetRow(14))
+        self.assertEqual(['Af', 'Betaalautomaat'], list(CsvTool(inColumns=['AfBij', 'MutatieSoort']).StreamFile(files))[1])
+        self.assertRaises(ValueError, CsvTool(inColumns=['Foo']).LoadFile, files)
+    
+    def testFilter(self):
+        """With inFilter only the rows matching it should be loaded, with the lines of their CSV files"""
+        files = ['test/first.csv', 'test/second.csv']
+        tree = ('and', (('==', 'AfBij', 'Af'), ('>=', 'Datum', '20130201')))
+        expected = CsvTool(self.d.columnar)
+        expected.LoadFile(files)
+        result, ind = expected.RunQuery(tree)
+        for processes in [None, 2]:
+            d = CsvTool(self.d.columnar)
+            d.LoadFile(files, processes, inFilter=tree)
+            self.assertEqual(result, [d.GetRow(j) for j in range(d.GetRowCount())])
+            self.assertEqual([('test/first.csv', 5), ('test/first.csv', 8), ('test/second.csv', 3)], [d.GetSource(j) for j in range(3)])
+            self.assertNotEqual(expected.fingerprint, d.fingerprint)
+        
+        start = d.AppendRows([['20140501', '', '', '', 'XX', 'Af', '1', 'Nieuw', ''], ['20140501', '', '', '', 'XX', 'Bij', '1', 'Nieuw', '']])
+        self.assertEqual(len(result) + 1, d.GetRowCount())
+        self.assertEqual(('<appended>', 2), d.GetSource(start))
+        
+        d = CsvTool(self.d.columnar, inColumns=['BedragEUR'])
+        d.LoadFile(files, inFilter=tree)
+        self.assertEqual([[row[6]] for row in result], [d.GetRow(j) for j in range(d.GetRowCount())])
+        self.assertRaises(ValueError, CsvTool().LoadFile, files, inFilter=('==', 'Foo', '1'))
+        d = CsvTool()
+        d.SAMPLE_SIZE = 1
+        self.assertRaises(ValueError, d.LoadFile, 'test/badnumber.csv', inFilter=('>', 'Float', '1'))
     
     #def testDate(self):
     #    """It should be possible to do query operations on Dates"""
@@ -147,6 +429,60 @@ class TestLoadCsvFile(unittest.TestCase):
     #        dates.append(result[i][idx])
     #    self.assertEqual(['20130615','20120628'], dates)
 
+class TestLoadCsvFileColumnar(TestLoadCsvFile):
+    """The columnar backend should give the same results as the default backend"""
+
+    def setUp(self):
+        logger.warning('Tester setUp')
+        self.d=CsvTool(inColumnar=True)
+        self.d.LoadFile('test/unittest.csv')
+
+    def testColumns(self):
+        """Numeric columns should be stored in arrays"""
+        idx = self.d.GetHeaderNames().index('Int')
+        self.assertEqual('l', self.d.columns[idx].typecode)
+        idx = self.d.GetHeaderNames().index('Float')
+        self.assertEqual('d', self.d.columns[idx].typecode)
+        self.assertEqual(7, self.d.GetRowCount())
+        self.assertEqual([6, None, 'Doei!', 'Jul 28, 2013', ','], self.d.GetRow(5))
+
+    def testDictionaryColumn(self):
+        """String columns with few distinct values should be dictionary-encoded and give the same results"""
+        files = ['test/first.csv', 'test/second.csv']
+        d = CsvTool(inColumnar=True)
+        d.LoadFile(files)
+        expected = CsvTool()
+        expected.LoadFile(files)
+        column = d.GetColumn('AfBij')
+        self.assertTrue(isinstance(column, DictionaryColumn))
+        self.assertEqual('H', column.codes.typecode)
+        self.assertEqual(expected.GetColumn('AfBij'), list(column))
+        queries = [('and', (('==', 'AfBij', 'Af'), ('in', 'MutatieSoort', 'automaat'))),
+                   ('or', (('==', 'Code', 'XX'), ('>=', 'Code', 'OV'))),
+                   "AfBij == 'Bij' and Code != 'VZ'"]
+        self.assertEqual(expected.RunQueries(queries), d.RunQueries(queries))
+        self.assertEqual([expected.RunQuery(query) for query in queries], [d.RunQuery(query) for query in queries])
+        row = ['20140501', '', '', '', 'XX', 'Af', '1', 'Nieuw', '']
+        d.AppendRows([row])
+        expected.AppendRows([row])
+        self.assertEqual(expected.RunQueries(queries), d.RunQueries(queries))
+
+class TestLoadCsvFileTextIndex(TestLoadCsvFile):
+    """Queries on a column with a text index should give the same results as without the index"""
+
+    def setUp(self):
+        logger.warning('Tester setUp')
+        self.d=CsvTool(inTextIndexes=['String'])
+        self.d.LoadFile('test/unittest.csv')
+
+    def testTextIndex(self):
+        """Substring terms should be answered from the index"""
+        tree = ('and', (('in', 'String', 'all'), ('==', 'Int', '2')))
+        result, ind = self.d.RunQuery(tree)
+        self.assertEqual([2], ind)
+        result, ind = self.d.RunQuery(('or', (('in', 'String', 'oei'), ('in', 'String', 'Zou'))))
+        self.assertEqual([1, 5], ind)
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,46 @@
+from array import array
+from itertools import imap
+
+class DictionaryColumn:
+    """String column stored as an array of integer codes and the list of its distinct values, the code of a cell
+    is the index of its value in that list. It is meant for columns with few distinct values, like AfBij, Code and MutatieSoort:
+    a cell takes 2 bytes while there are at most 65536 distinct values.
+    It behaves like a list of strings (len, index, iterate, append), so the indexes built on a column work on it as well.
+    The query compiler compares the codes directly, see QueryCompiler.BuildPredicate"""
+    def __init__ (self, inCells=(), inValues=None, inCodes=None):
+        """The column is built from its cells, or from its distinct values and the array of their codes"""
+        self.values = []
+        self.codeOfValue = {}
+        self.codes = array ('H')
+        if inValues is not None:
+            self.values = list (inValues)
+            self.codeOfValue = dict ((value, code) for code, value in enumerate (self.values))
+            self.codes = array ('H' if len (self.values) <= 0x10000 else 'l', inCodes)
+        for cell in inCells:
+            self.append (cell)
+
+    def GetCode (self, inValue):
+        """Return the code of a value, or None when no cell has that value"""
+        return self.codeOfValue.get (inValue)
+
+    def GetValues (self, inFirstRow=0):
+        """Return the strings of the cells from row inFirstRow on"""
+        return map (self.values.__getitem__, self.codes [inFirstRow:])
+
+    def append (self, inValue):
+        code = self.codeOfValue.get (inValue)
+        if code is None:
+            code = self.codeOfValue [inValue] = len (self.values)
+            self.values.append (intern (str (inValue)))
+            if code > 0xFFFF and self.codes.typecode == 'H':
+                self.codes = array ('l', self.codes)
+        self.codes.append (code)
+
+    def __len__ (self):
+        return len (self.codes)
+
+    def __getitem__ (self, inIndex):
+        return self.values [self.codes [inIndex]]
+
+    def __iter__ (self):
+        return imap (self.values.__getitem__, self.codes)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+import unittest
+import logging
+from DictionaryColumn import DictionaryColumn
+
+# setup logger
+logging.basicConfig(format='%(asctime)-15s %(message)s', filename='DictionaryColumnTester.log')
+logger = logging.getLogger(__name__)
+
+
+class DictionaryColumnTester(unittest.TestCase):
+
+    def setUp(self):
+        self.column = DictionaryColumn (['Af', 'Bij', 'Af', 'Af', 'Bij'])
+
+    def testEncode (self):
+        """Every distinct value should get one code, the column should still read as strings"""
+        self.assertEqual (['Af', 'Bij'], self.column.values)
+        self.assertEqual ([0, 1, 0, 0, 1], list (self.column.codes))
+        self.assertEqual ('H', self.column.codes.typecode)
+        self.assertEqual (['Af', 'Bij', 'Af', 'Af', 'Bij'], list (self.column))
+        self.assertEqual ('Bij', self.column [4])
+        self.assertEqual (5, len (self.column))
+        self.assertEqual (1, self.column.GetCode ('Bij'))
+        self.assertEqual (None, self.column.GetCode ('Foo'))
+
+    def testAppend (self):
+        """Appending a new value should add it to the dictionary"""
+        self.column.append ('Foo')
+        self.column.append ('Af')
+        self.assertEqual ([0, 1, 0, 0, 1, 2, 0], list (self.column.codes))
+        self.assertEqual ('Foo', self.column [5])
+
+    def testManyValues (self):
+        """The codes should be widened when they do not fit in 2 bytes"""
+        column = DictionaryColumn (str (k) for k in range (0x10002))
+        self.assertEqual ('l', column.codes.typecode)
+        self.assertEqual ('65537', column [0x10001])
+        self.assertEqual ('7', column [7])
+
+if __name__ == '__main__':
+    unittest.main()
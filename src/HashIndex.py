@@ -0,0 +1,26 @@
+from array import array
+
+class HashIndex:
+    """Index from the values of a column to the rows having that value.
+    It is meant for columns with few distinct values, like AfBij, Code and Tegenrekening"""
+    def __init__ (self, inColumn):
+        self.rows = {}
+        self.Extend (inColumn, 0)
+
+    def Extend (self, inColumn, inFirstRow):
+        """Add the rows of cells appended to the column, inColumn has the cells from row inFirstRow on"""
+        for j, value in enumerate (inColumn, inFirstRow):
+            if value != value:
+                # NaN is never equal to a value of a query
+                continue
+            rows = self.rows.get (value)
+            if rows is None:
+                rows = self.rows [value] = array ('l')
+            rows.append (j)
+
+    def GetRows (self, inValue):
+        """Return the sorted rows having the value inValue"""
+        return self.rows.get (inValue, ())
+
+    def GetValues (self):
+        return self.rows.keys ()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+import unittest
+import logging
+from HashIndex import HashIndex
+
+# setup logger
+logging.basicConfig(format='%(asctime)-15s %(message)s', filename='HashIndexTester.log')
+logger = logging.getLogger(__name__)
+
+
+class HashIndexTester(unittest.TestCase):
+
+    def setUp(self):
+        self.index = HashIndex (['Af', 'Bij', 'Af', 'Af', 'Bij'])
+
+    def testGetRows (self):
+        """The index should return the rows having a value"""
+        self.assertEqual ([0, 2, 3], list (self.index.GetRows ('Af')))
+        self.assertEqual ([1, 4], list (self.index.GetRows ('Bij')))
+        self.assertEqual ([], list (self.index.GetRows ('Foo')))
+        self.assertEqual (['Af', 'Bij'], sorted (self.index.GetValues ()))
+
+    def testNaN (self):
+        """Empty cells of float columns are NaN in the columnar backend and should not be in the index"""
+        index = HashIndex ([1.0, float ('nan'), float ('nan'), 1.0])
+        self.assertEqual ([1.0], index.GetValues ())
+        self.assertEqual ([0, 3], list (index.GetRows (1.0)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,15 @@
 import os
 import re
 import xml.etree.ElementTree as ElementTree
+from multiprocessing import Pool
+from Aggregator import Aggregator
+from Bitmap import Bitmap
 from CsvTool import CsvTool
+from Profiler import Profiler
+from QueryCache import QueryCache
+from QueryCompiler import QueryCompiler
+from TableCache import TableCache
+from TransactionStore import TransactionStore
 
 # setup logger
 import logging
@@ -10,6 +18,14 @@ logging.basicConfig(format='%(asctime)-15s %(message)s', filename='IngTool.log')
 logger = logging.getLogger(__name__)
 logger.setLevel (logging.INFO)
 
+def RunAccountQueries (inArguments):
+    """Run a query file on the files of one account in a worker process of IngTool.RunQueriesPerAccount"""
+    settings, accounts, files, xmlfile = inArguments
+    ing = IngTool (**settings)
+    ing.accounts = accounts
+    ing.files = files
+    return ing.RunQueriesFromFile (xmlfile)
+
 class IngTool ():
     """This tool converts the af- en bijschrijving of an ING account to nice looking stats.
     To get af- en bijschrijvingen from an ING account, do the following:
@@ -27,17 +43,50 @@ class IngTool ():
        f. in column 'Rekening' replace all ' ' by ''
        g. replace all '"' by ''
        """
+    # the amounts are stored as integer cents, so the totals are exact
+    COL_TYPES = {'BedragEUR': 'cents'}
+    # the account of the files which are not in an <account> of the files XML file
+    DEFAULT_ACCOUNT = 'default'
+    # the columns used by the aggregates, which are loaded with inProjection whether the queries use them or not
+    REQUIRED_COLUMNS = ('Datum', 'AfBij', 'BedragEUR')
 
-    def __init__ (self):
+    def __init__ (self, inColumnar=False, inStreaming=False, inTextIndexes=(), inProcesses=None, inCacheDirectory=None, inStore=None, inSortedIndexes=(), inProfile=False, inProjection=False, inFilter=None):
         self.accounts ={}
         self.files = []
+        # the files per account, see LoadFilesFromFile
+        self.accountFiles = {}
         self.csv = None
+        self.columnar = inColumnar
+        self.streaming = inStreaming
+        self.textIndexes = inTextIndexes
+        self.sortedIndexes = inSortedIndexes
+        # with inProjection only the columns used by the queries are loaded, see LoadTable
+        self.projection = inProjection
+        # with inFilter (a query tree) only the rows matching it are loaded, e.g. ('>=', 'Datum', '20130101')
+        self.filter = inFilter
+        self.processes = inProcesses
+        self.cacheDirectory = inCacheDirectory
+        self.cache = None
+        # the results of queries are cached in memory, and kept between runs in the cache directory
+        self.queryCache = QueryCache ()
+        if inCacheDirectory:
+            self.cache = TableCache (inCacheDirectory)
+            self.queryCache = QueryCache (inFilename=os.path.join (inCacheDirectory, 'queries.marshal'))
+        self.store = None
+        if inStore:
+            self.store = TransactionStore (inStore, self.COL_TYPES)
+        # the results of the query files run on the table, which are updated by UpdateFromFiles
+        self.reports = {}
+        # with inProfile the time of loading and of every query is recorded, see GetStats
+        self.profiler = Profiler (inProfile)
         
         self.coveredIDs = []
         self.forgottenIDs = []
         
         self.idxEUR = None
-        self.allIndices = []
+        self.aggregator = None
+        # the rows matched by every query which was run on the table, a row may only be matched by one query
+        self.bitmaps = {}
         
     
     def LoadAccountsFromFile (self, inXmlfile):
@@ -55,18 +104,29 @@ class IngTool ():
             
     def LoadFilesFromFile (self, inXmlfile):
         """Read a XML file containing name of CSV files with af- en bijschrijvingen and store it in self.files (list)
-        The XML file has the following structure:
+        The files may be grouped per account, they are stored per account in self.accountFiles (dict) as well,
+        files outside an <account> belong to DEFAULT_ACCOUNT. The XML file has the following structure:
         <files path="PATH">
             <file name="NAME"/>
+            <account name="ACCOUNT">
+                <file name="NAME"/>
+                ...
+            </account>
             ...
         </files>
         """
         tree = ElementTree.parse (inXmlfile)
         files = tree.getroot ()
         path = files.attrib['path']
-        for file in files:
-            pathToFile = os.path.join (path, file.attrib['name'])
-            self.files.append (pathToFile)
+        for element in files:
+            account, elements = self.DEFAULT_ACCOUNT, [element]
+            if element.tag == 'account':
+                account, elements = element.attrib['name'], list (element)
+            accountFiles = self.accountFiles.setdefault (account, [])
+            for file in elements:
+                pathToFile = os.path.join (path, file.attrib['name'])
+                self.files.append (pathToFile)
+                accountFiles.append (pathToFile)
     
     def RunQueriesFromFile (self, inXmlfile):
         """Read a XML file containing the queries to run
@@ -88,14 +148,137 @@ class IngTool ():
                 </and>
             </query>
         </queries>"""
-        if not self.csv:
-            self.__LoadCsv (self.files)
-        self.idxEUR = self.csv.headers.index ('BedragEUR')
+        ret, keys, trees = self.__ReadQueries (inXmlfile)
+        labels = [inXmlfile + ':' + '/'.join (key) for key in keys]
+        
+        if self.streaming:
+            totals = self.__RunQueriesOnStream (trees)
+        else:
+            totals = self.__RunQueriesOnTable (trees, labels)
+            self.reports [inXmlfile] = (ret, keys, trees, labels, totals)
+            self.queryCache.Save ()
+        
+        self.__SetResults (ret, keys, totals)
+        return ret
+    
+    def RunQueriesPerAccount (self, inXmlfile):
+        """Run the queries of a XML file (see RunQueriesFromFile) on the files of every account (see LoadFilesFromFile) separately.
+        Every account is loaded, queried and aggregated in its own worker process, by default one per account,
+        so the run takes the time of the largest account. With a cache directory or a transaction store
+        every account gets its own subdirectory or store file.
+        Returns the result dict with the totals of all accounts and a dict from account to its result dict"""
+        accounts = sorted (account for account, files in self.accountFiles.items () if files)
+        arguments = []
+        for account in accounts:
+            settings = {'inColumnar': self.columnar, 'inStreaming': self.streaming,
+                        'inTextIndexes': self.textIndexes, 'inSortedIndexes': self.sortedIndexes,
+                        'inProjection': self.projection, 'inFilter': self.filter}
+            if self.cacheDirectory:
+                settings ['inCacheDirectory'] = os.path.join (self.cacheDirectory, account)
+            if self.store:
+                root, extension = os.path.splitext (self.store.filename)
+                settings ['inStore'] = '%s_%s%s' % (root, account, extension)
+            arguments.append ((settings, self.accounts, self.accountFiles [account], inXmlfile))
         
+        pool = Pool (self.processes or max (1, len (accounts)))
+        try:
+            results = pool.map (RunAccountQueries, arguments)
+        finally:
+            pool.close ()
+            pool.join ()
+        
+        retPerAccount = dict (zip (accounts, results))
+        ret = {}
+        for result in results:
+            ret = self.__MergeResults (ret, result)
+        return ret, retPerAccount
+    
+    def __MergeResults (self, inRet, inOther):
+        """Return the sum of two result dicts, the totals are added in cents so the sum is exact"""
+        ret = dict (inRet)
+        for key, value in inOther.items ():
+            if isinstance (value, dict):
+                ret [key] = self.__MergeResults (ret.get (key, {}), value)
+            else:
+                ret [key] = (int (round (ret.get (key, 0) * 100)) + int (round (value * 100))) / 100.0
+        return ret
+    
+    def UpdateFromFiles (self):
+        """Ingest the CSV files in the transaction store again, e.g. after the export of the current year is downloaded again.
+        Only the rows which are not in the store yet are added to the table, and the results of the query files
+        which were run before are updated with these rows only. The dicts returned by RunQueriesFromFile are updated in place.
+        The files are ingested in the order of self.files, which has to be date order, see TransactionStore.
+        Returns the number of new rows"""
+        if not self.store:
+            raise ValueError ("UpdateFromFiles needs a transaction store")
+        rows = []
+        # the new rows are appended to the store after its current rows
+        firstLine = self.store.rowCount + 2
+        try:
+            for filename in self.files:
+                rows += self.store.Ingest (filename)
+        finally:
+            # a rejected file leaves the store as it was, the rows of the files before it are in the store already
+            if rows and self.csv:
+                self.__AppendToTable (rows, firstLine)
+        return len (rows)
+    
+    def __AppendToTable (self, inRows, inFirstLine):
+        """Append rows of the store starting at line inFirstLine to the table and add them to the results of the query files which were run before"""
+        start = self.csv.AppendRows (inRows, self.store.filename, inFirstLine)
+        for ret, keys, trees, labels, totals in self.reports.values ():
+            newTotals = self.__RunQueriesOnTable (trees, labels, start)
+            for k, total in enumerate (newTotals):
+                totals [k] += total
+            self.__SetResults (ret, keys, totals)
+    
+    def GroupQueriesFromFile (self, inXmlfile, inPeriod='month'):
+        """Run the queries of a XML file (see RunQueriesFromFile) in a single scan over the table and return
+        per query the totals per period of Datum: 'year', 'quarter', 'month' or 'week' (see CsvTool.GetBuckets).
+        The result dict is the same as the one of RunQueriesFromFile, with {bucket: total} instead of the totals"""
+        ret, keys, trees = self.__ReadQueries (inXmlfile)
+        labels = [inXmlfile + ':' + '/'.join (key) for key in keys]
+        
+        indicesPerQuery = self.__MatchQueriesOnTable (trees, labels)
+        start = self.profiler.Start ()
+        buckets = self.csv.GetBuckets ('Datum', inPeriod)
+        aggregator = self.GetAggregator ()
+        for key, indices in zip (keys, indicesPerQuery):
+            totals = aggregator.SumBy (indices, buckets)
+            self.__SetResult (ret, key, dict ((bucket, total / 100.0) for bucket, total in totals.items ()))
+        self.profiler.Stop ('aggregate', start)
+        return ret
+    
+    def GetStats (self):
+        """Return the statistics recorded by the profiler when the tool was made with inProfile:
+        {'stages': {STAGE: {'time', 'calls'}}, 'counters': {COUNTER: COUNT}, 'queries': {LABEL: {'time', 'runs', 'rowsScanned',
+        'rowsMatched', 'indexHits', 'cacheHits'}}}, the label of a query is QUERYFILE:NAME/SUBNAME/SUBSUBNAME.
+        self.profiler.ToJson exports them as JSON"""
+        return self.profiler.GetStats ()
+    
+    def __SetResults (self, ioRet, inKeys, inTotals):
+        """Set the totals in cents as euros in the result dict"""
+        for key, total in zip (inKeys, inTotals):
+            self.__SetResult (ioRet, key, total / 100.0)
+    
+    def __SetResult (self, ioRet, inKey, inValue):
+        if len (inKey) == 3:
+            ioRet [inKey[0]][inKey[1]][inKey[2]] = inValue
+        elif len (inKey) == 2:
+            ioRet [inKey[0]][inKey[1]] = inValue
+        else:
+            ioRet [inKey[0]] = inValue
+    
+    def __ReadQueries (self, inXmlfile):
+        """Read the queries of a XML file.
+        Returns the empty result dict, the key of every query in the result dict and the query trees"""
         tree = ElementTree.parse (inXmlfile)
         queries = tree.getroot ()
+        compiler = QueryCompiler (self.accounts)
         
         ret = {}
+        keys = []
+        trees = []
         for query in queries:
             hasSubname = False
             hasSubsubname = False
@@ -116,34 +299,167 @@ class IngTool ():
                 if subsubname not in ret [name][subname]:
                     ret [name][subname][subsubname] = {}
             
-            query = self.ConvertQueryToStringRecursive (query)
-            query = self.SubstituteAccounts (query)
-            
-            result, indices = self.csv.RunQuery (query)
-            self.allIndices += indices
-            
-            total = 0.0
-            for row in result:
-                total += float (row [self.idxEUR])
-            
             if hasSubsubname:
-                ret [name][subname][subsubname] = total
+                keys.append ((name, subname, subsubname))
             elif hasSubname:
-                ret [name][subname] = total
+                keys.append ((name, subname))
             else:
-                ret [name] = total
-            
-        if self.HasDuplicates (self.allIndices):
-            duplicates = GetDuplicates (self.allIndices)
+                keys.append ((name,))
+            trees.append (compiler.ConvertQueryToTree (query))
+        
+        return ret, keys, trees
+    
+    def __RunQueriesOnTable (self, inTrees, inLabels, inFirstRow=0):
+        """Evaluate all queries in a single scan over the loaded table, or over its rows from inFirstRow on,
+        and return the total of every query"""
+        indicesPerQuery = self.__MatchQueriesOnTable (inTrees, inLabels, inFirstRow)
+        start = self.profiler.Start ()
+        aggregator = self.GetAggregator ()
+        totals = [aggregator.Aggregate (indices) ['sum'] for indices in indicesPerQuery]
+        self.profiler.Stop ('aggregate', start)
+        return totals
+    
+    def __MatchQueriesOnTable (self, inTrees, inLabels, inFirstRow=0):
+        """Evaluate all queries in a single scan over the loaded table, or over its rows from inFirstRow on,
+        and return the rows matched by every query. The matched rows are added to the bitmap of the label of the query"""
+        self.LoadTable (inTrees)
+        self.idxEUR = self.csv.headers.index ('BedragEUR')
+        
+        results = self.csv.RunQueries (inTrees, inFirstRow, inLabels)
+        
+        indicesPerQuery = []
+        for label, (result, indices) in zip (inLabels, results):
+            self.bitmaps [label] = self.bitmaps.get (label, Bitmap ()) | Bitmap (indices)
+            indicesPerQuery.append (indices)
+        
+        # a row matched by two queries overlaps the union of the bitmaps before it
+        matched = Bitmap ()
+        for bitmap in self.bitmaps.values ():
+            if matched & bitmap:
+                self.__LogOverlapMatrix (self.GetOverlapMatrix (self.bitmaps))
+                raise AssertionError, "Duplicates found in all indices. See log file for more info"
+            matched |= bitmap
+        
+        return indicesPerQuery
+    
+    def RunQuery (self, inQuery):
+        """Run an ad-hoc <query> element or XML string (see RunQueriesFromFile) on the table and return the count, sum, net,
+        min, max and mean in cents of the matched rows (see Aggregator). The rows are not added to the bitmaps of the query files"""
+        if isinstance (inQuery, basestring):
+            inQuery = ElementTree.fromstring (inQuery)
+        tree = QueryCompiler (self.accounts).ConvertQueryToTree (inQuery)
+        self.LoadTable ([tree])
+        rows, indices = self.csv.RunQuery (tree)
+        return self.GetAggregator ().Aggregate (indices)
+    
+    def ForgetQueriesFromFile (self, inXmlfile):
+        """Forget the results of a query file, e.g. before running it again after it changed, so the rows of its
+        changed queries are not taken as overlapping with the rows they matched before"""
+        for label in self.bitmaps.keys ():
+            if label.startswith (inXmlfile + ':'):
+                del self.bitmaps [label]
+        self.reports.pop (inXmlfile, None)
+    
+    def LoadTable (self, inTrees=()):
+        """Load the table from the files, when it is not loaded yet.
+        With inProjection only the columns used by the query trees inTrees and REQUIRED_COLUMNS are loaded,
+        and the table is loaded again with the columns it has and the new ones when a query tree uses another column"""
+        columns = self.__GetColumns (inTrees)
+        if self.csv and columns and not columns <= set (self.csv.headers):
+            # the rows are the same, so the bitmaps and reports stay valid
+            columns |= set (self.csv.headers)
+            self.csv = None
+            self.aggregator = None
+        if not self.csv:
+            self.__LoadCsv (self.files, columns)
+    
+    def __GetColumns (self, inTrees):
+        """Return the columns to load for query trees, None for all columns when the tool does not project"""
+        if not self.projection:
+            return None
+        compiler = QueryCompiler ()
+        # the columns with an index are loaded as well, so their indexes can be built
+        columns = set (self.REQUIRED_COLUMNS) | set (self.textIndexes) | set (self.sortedIndexes)
+        for tree in inTrees:
+            compiler.GetColumns (tree, columns)
+        return columns
+    
+    def Reload (self):
+        """Forget the loaded table and the results of all query files, the table is loaded again from the files
+        by the next query. With a cache directory only the changed files are read again"""
+        self.csv = None
+        self.aggregator = None
+        self.bitmaps = {}
+        self.reports = {}
+    
+    def GetAggregator (self):
+        """Return the Aggregator of the amounts in the table, the rows appended to the table are added to it"""
+        if self.aggregator is None:
+            self.aggregator = Aggregator (self.csv.GetColumn ('BedragEUR'), self.csv.GetColumn ('AfBij'))
+        elif len (self.aggregator) < self.csv.GetRowCount ():
+            first = len (self.aggregator)
+            self.aggregator.Extend (self.csv.GetColumn ('BedragEUR', first), self.csv.GetColumn ('AfBij', first))
+        return self.aggregator
+    
+    def GetAggregates (self, inXmlfile, inKey):
+        """Return the count, sum, net, min, max and mean in cents (see Aggregator) of the rows matched by a query,
+        inKey is (name, subname, subsubname) of the query as far as they are given"""
+        label = inXmlfile + ':' + '/'.join (inKey)
+        return self.GetAggregator ().Aggregate (self.bitmaps [label])
+    
+    def GetOverlapMatrix (self, inBitmaps):
+        """Return the rows shared by every pair of queries in a dict {(label, label): [row, ...]},
+        pairs which share no rows are left out"""
+        labels = sorted (inBitmaps.keys ())
+        matrix = {}
+        for i, label in enumerate (labels):
+            for other in labels [i + 1:]:
+                shared = inBitmaps [label] & inBitmaps [other]
+                if shared:
+                    matrix [(label, other)] = list (shared)
+        return matrix
+    
+    def __LogOverlapMatrix (self, inMatrix):
+        logger.error ("Double indices, results cannot be thrusted! Rows matched by more than one query:")
+        for (label, other), rows in sorted (inMatrix.items ()):
+            logger.error ("%s x %s: %d rows %s", label, other, len (rows), rows)
+    
+    def __RunQueriesOnStream (self, inTrees):
+        """Evaluate all queries on the rows streamed from the CSV files and return the total of every query.
+        Only the totals are kept in memory, a row matching more than one query is a duplicate"""
+        start = self.profiler.Start ()
+        trees = inTrees
+        if self.filter is not None:
+            # a streamed row is only counted when it matches the filter
+            trees = [('and', (self.filter, tree)) for tree in inTrees]
+        csv = CsvTool (inColTypes=self.COL_TYPES, inProfiler=self.profiler, inColumns=self.__GetColumns (trees))
+        rows = csv.StreamQueries (self.files, trees)
+        self.idxEUR = csv.headers.index ('BedragEUR')
+        
+        totals = [0] * len (inTrees)
+        duplicates = set ()
+        for index, row, matches in rows:
+            if len (matches) > 1:
+                duplicates.add (index)
+            for match in matches:
+                totals [match] += row [self.idxEUR] or 0
+        self.profiler.Stop ('stream', start)
+        
+        if duplicates:
             logger.error ("Double indices, results cannot be thrusted! Doubles are: %s" % duplicates)
             raise AssertionError, "Duplicates found in all indices. See log file for more info"
-            
-        return ret
+        
+        return totals
     
-    def __LoadCsv (self, inCsvFiles):
-        """Prepare CsvTool to run queries on CSV file(s)"""
-        self.csv = CsvTool ()
-        self.csv.LoadFile (inCsvFiles)
+    def __LoadCsv (self, inCsvFiles, inColumns=None):
+        """Prepare CsvTool to run queries on CSV file(s), with inColumns only these columns are loaded"""
+        self.csv = CsvTool (self.columnar, self.textIndexes, self.COL_TYPES, self.sortedIndexes, self.queryCache, self.profiler, inColumns)
+        if self.store:
+            # only the new rows of the files are added to the store, the table is the whole store
+            for filename in inCsvFiles:
+                self.store.Ingest (filename)
+            inCsvFiles = self.store.filename
+        self.csv.LoadFile (inCsvFiles, self.processes, self.cache, self.filter)
         
     def HasDuplicates (self, inList):
         lenList = len (inList)
@@ -152,11 +468,11 @@ class IngTool ():
         
     def GetDuplicates (self, inIndices):
         ret = set()
-        previousIndex = None
+        seen = set()
         for index in inIndices:
-            if index is previousIndex:
+            if index in seen:
                 ret.add (index)
-            previousIndex = index
+            seen.add (index)
         return ret
         
         
@@ -203,7 +519,7 @@ class IngTool ():
         
         
 if __name__ == '__main__':
-    ing = IngTool ()
+    ing = IngTool (inCacheDirectory="cache")
     ing.LoadAccountsFromFile ("accounts.xml")
     ing.LoadFilesFromFile ("files.xml")
     ing.RunQueriesFromFile ("queries.xml")
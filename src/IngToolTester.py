@@ -1,8 +1,13 @@
 #!/usr/bin/env python
 import unittest
+import json
 import logging
 import os
+import shutil
+import tempfile
 import xml.etree.ElementTree as ElementTree
+from Aggregator import Aggregator
+from Bitmap import Bitmap
 from IngTool import IngTool
 
 # setup logger
@@ -25,6 +30,30 @@ class IngToolTester(unittest.TestCase):
         self.ing.LoadFilesFromFile ("test/test_files.xml")
         self.assertEqual (["test/first.csv", "test/second.csv"], self.ing.files)
         
+    def testLoadAccountFilesFromFile (self):
+        """Files grouped per account should be stored per account as well"""
+        self.ing.LoadFilesFromFile ("test/test_account_files.xml")
+        self.assertEqual (["test/first.csv", "test/second.csv"], self.ing.files)
+        self.assertEqual ({'first': ["test/first.csv"], 'second': ["test/second.csv"]}, self.ing.accountFiles)
+        
+    def testRunQueriesPerAccount (self):
+        """The totals per account should be those of the files of the account, the combined totals those of all files"""
+        expected = IngTool ()
+        expected.LoadAccountsFromFile ("test/test_accounts.xml")
+        expected.LoadFilesFromFile ("test/test_files.xml")
+        expectedPerAccount = {}
+        for account in ['first', 'second']:
+            ing = IngTool ()
+            ing.LoadAccountsFromFile ("test/test_accounts.xml")
+            ing.files = ["test/%s.csv" % account]
+            expectedPerAccount [account] = ing.RunQueriesFromFile ("test/test_queries.xml")
+        
+        self.ing.LoadAccountsFromFile ("test/test_accounts.xml")
+        self.ing.LoadFilesFromFile ("test/test_account_files.xml")
+        ret, retPerAccount = self.ing.RunQueriesPerAccount ("test/test_queries.xml")
+        self.assertEqual (expectedPerAccount, retPerAccount)
+        self.assertEqual (expected.RunQueriesFromFile ("test/test_queries.xml"), ret)
+        
     def testConvertQueryToString (self):
         """It should be simple to define queries in XML file which are parsed easily"""
         query  = ElementTree.Element ("query")
@@ -81,6 +110,20 @@ class IngToolTester(unittest.TestCase):
         expected = set([1,2,3,8])
         actual = self.ing.GetDuplicates ([0,1,1,2,2,2,3,3,4,5,6,7,8,8])
         self.assertEqual (expected, actual)
+        self.assertEqual (set([1]), self.ing.GetDuplicates ([1,0,1]))
+        
+    def testOverlapMatrix (self):
+        """The overlap matrix should give the rows shared by every pair of queries"""
+        bitmaps = {'a': Bitmap ([0, 1, 5]), 'b': Bitmap ([1, 2, 5]), 'c': Bitmap ([3])}
+        self.assertEqual ({('a', 'b'): [1, 5]}, self.ing.GetOverlapMatrix (bitmaps))
+        
+    def testOverlappingQueries (self):
+        """Running queries which match the same rows should fail"""
+        self.ing.LoadAccountsFromFile ("test/test_accounts.xml")
+        self.ing.LoadFilesFromFile ("test/test_files.xml")
+        self.ing.RunQueriesFromFile ("test/test_queries.xml")
+        self.ing.bitmaps ['other'] = Bitmap ([4])
+        self.assertRaises (AssertionError, self.ing.RunQueriesFromFile, "test/test_queries.xml")
         
         
     def testRunQueriesFromFile (self):
@@ -88,9 +131,121 @@ class IngToolTester(unittest.TestCase):
         self.ing.LoadAccountsFromFile ("test/test_accounts.xml")
         self.ing.LoadFilesFromFile ("test/test_files.xml")
         results = self.ing.RunQueriesFromFile ("test/test_queries.xml")
+        self.assertAlmostEqual (798.63, results ['inkomsten']['private']['ashgard'])
+        self.assertAlmostEqual (147.0, results ['inkomsten']['other'])
+        self.assertAlmostEqual (0.0, results ['uitgaven']['overige']['klussen'])
+        self.assertEqual ([0, 7], list (self.ing.bitmaps ['test/test_queries.xml:inkomsten/private/ashgard']))
+        self.assertEqual ([4, 11], list (self.ing.bitmaps ['test/test_queries.xml:inkomsten/other']))
+        
+        
+        
+        
+        # ik wil graag de results naar een XML file gooien, dat is veel mooier dan wat ik nu heb...
         
+    def testGetAggregates (self):
+        """The aggregates of a query should be exact in cents"""
+        self.ing.LoadAccountsFromFile ("test/test_accounts.xml")
+        self.ing.LoadFilesFromFile ("test/test_files.xml")
+        self.ing.RunQueriesFromFile ("test/test_queries.xml")
+        expected = {'count': 2, 'sum': 79863, 'net': 79863, 'min': 34323, 'max': 45540, 'mean': 39931.5}
+        self.assertEqual (expected, self.ing.GetAggregates ("test/test_queries.xml", ('inkomsten', 'private', 'ashgard')))
+        self.assertEqual (7800 - 891, self.ing.GetAggregator ().Aggregate ([2, 11]) ['net'])
+        
+    def testGroupQueriesFromFile (self):
+        """The totals of the queries should be given per period of Datum"""
+        self.ing.LoadAccountsFromFile ("test/test_accounts.xml")
+        self.ing.LoadFilesFromFile ("test/test_files.xml")
+        results = self.ing.GroupQueriesFromFile ("test/test_queries.xml", 'year')
+        self.assertEqual ({2013: 455.4, 2014: 343.23}, results ['inkomsten']['private']['ashgard'])
+        self.assertEqual ({}, results ['uitgaven']['overige']['klussen'])
+        results = self.ing.GroupQueriesFromFile ("test/test_queries.xml", 'quarter')
+        self.assertEqual ({20131: 69.0, 20141: 78.0}, results ['inkomsten']['other'])
+        
+    def testGetStats (self):
+        """With profiling the stages and every query should be recorded"""
+        ing = IngTool (inProfile=True)
+        ing.LoadAccountsFromFile ("test/test_accounts.xml")
+        ing.LoadFilesFromFile ("test/test_files.xml")
+        ing.RunQueriesFromFile ("test/test_queries.xml")
+        ing.RunQueriesFromFile ("test/test_queries.xml")
+        stats = ing.GetStats ()
+        for stage in ['load', 'typeInference', 'convert', 'indexes', 'compile', 'evaluate', 'aggregate']:
+            self.assertTrue (stage in stats ['stages'], stage)
+        self.assertEqual (14, stats ['counters'] ['rowsLoaded'])
+        query = stats ['queries'] ['test/test_queries.xml:inkomsten/private/ashgard']
+        self.assertEqual ((2, 4, 1, 1), (query ['runs'], query ['rowsMatched'], query ['indexHits'], query ['cacheHits']))
+        self.assertEqual (14, stats ['queries'] ['test/test_queries.xml:uitgaven/overige/klussen'] ['rowsScanned'])
+        self.assertEqual (stats, json.loads (ing.profiler.ToJson ()))
+        self.assertEqual ({}, self.ing.GetStats () ['queries'])
+        
+    def testProjection (self):
+        """With projection only the used columns should be loaded, the results should be the same"""
+        self.ing.LoadAccountsFromFile ("test/test_accounts.xml")
+        self.ing.LoadFilesFromFile ("test/test_files.xml")
+        expected = self.ing.RunQueriesFromFile ("test/test_queries.xml")
+        for streaming in [True, False]:
+            ing = IngTool (inStreaming=streaming, inProjection=True)
+            ing.LoadAccountsFromFile ("test/test_accounts.xml")
+            ing.LoadFilesFromFile ("test/test_files.xml")
+            self.assertEqual (expected, ing.RunQueriesFromFile ("test/test_queries.xml"))
+        self.assertEqual (['Datum', 'Tegenrekening', 'AfBij', 'BedragEUR', 'Mededelingen'], ing.csv.headers)
+        # a query on another column loads the table again with that column
+        query = '<query name="a"><and Code="BA"/><and AfBij="Af"/></query>'
+        self.assertEqual (self.ing.RunQuery (query), ing.RunQuery (query))
+        self.assertEqual (['Datum', 'Tegenrekening', 'Code', 'AfBij', 'BedragEUR', 'Mededelingen'], ing.csv.headers)
+        self.assertEqual (expected, ing.RunQueriesFromFile ("test/test_queries.xml"))
+        
+    def testFilter (self):
+        """With a filter the results should be those of the rows matching the filter"""
+        self.ing.LoadAccountsFromFile ("test/test_accounts.xml")
+        self.ing.files = ["test/second.csv"]
+        expected = self.ing.RunQueriesFromFile ("test/test_queries.xml")
+        for streaming in [False, True]:
+            ing = IngTool (inStreaming=streaming, inProjection=True, inFilter=('>=', 'Datum', '20140101'))
+            ing.LoadAccountsFromFile ("test/test_accounts.xml")
+            ing.LoadFilesFromFile ("test/test_files.xml")
+            self.assertEqual (expected, ing.RunQueriesFromFile ("test/test_queries.xml"))
+        
+    def testRunQueriesFromFileStreaming (self):
+        """Streaming the CSV files should give the same results as loading them"""
+        self.ing.LoadAccountsFromFile ("test/test_accounts.xml")
+        self.ing.LoadFilesFromFile ("test/test_files.xml")
+        expected = self.ing.RunQueriesFromFile ("test/test_queries.xml")
+        
+        ing = IngTool (inStreaming=True)
+        ing.LoadAccountsFromFile ("test/test_accounts.xml")
+        ing.LoadFilesFromFile ("test/test_files.xml")
+        actual = ing.RunQueriesFromFile ("test/test_queries.xml")
+        self.assertEqual (expected, actual)
+        self.assertEqual (None, ing.csv)
+        
+    def testUpdateFromFiles (self):
+        """Results should be updated with only the new rows when the files are ingested again"""
+        directory = tempfile.mkdtemp ()
+        try:
+            ing = IngTool (inStore=os.path.join (directory, 'store.csv'))
+            ing.LoadAccountsFromFile ("test/test_accounts.xml")
+            ing.files = ["test/first.csv"]
+            results = ing.RunQueriesFromFile ("test/test_queries.xml")
+            self.assertAlmostEqual (455.4, results ['inkomsten']['private']['ashgard'])
+            self.assertEqual (0, ing.UpdateFromFiles ())
+            aggregator = ing.GetAggregator ()
+            
+            ing.files = ["test/first.csv", "test/second.csv"]
+            self.assertEqual (7, ing.UpdateFromFiles ())
+            self.assertAlmostEqual (798.63, results ['inkomsten']['private']['ashgard'])
+            self.assertAlmostEqual (147.0, results ['inkomsten']['other'])
+            self.assertEqual (14, ing.csv.GetRowCount ())
+            # the appended rows are after the rows of the store which were loaded
+            self.assertEqual ((ing.store.filename, 9), ing.csv.GetSource (7))
+            self.assertEqual ((ing.store.filename, 15), ing.csv.GetSource (13))
+            # the aggregator gets the appended rows
+            self.assertTrue (aggregator is ing.GetAggregator ())
+            expected = Aggregator (ing.csv.GetColumn ('BedragEUR'), ing.csv.GetColumn ('AfBij'))
+            self.assertEqual ((expected.amounts, expected.signed), (aggregator.amounts, aggregator.signed))
+        finally:
+            shutil.rmtree (directory)
         
-        ik wil graag de results naar een XML file gooien, dat is veel mooier dan wat ik nu heb...
         
         
 if __name__ == '__main__':
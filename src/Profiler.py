@@ -0,0 +1,55 @@
+import json
+import time
+
+class Profiler:
+    """Opt-in instrumentation of loading and running queries, see inProfiler of CsvTool and inProfile of IngTool.
+    It records per stage (load, typeInference, convert, indexes, compile, evaluate, aggregate) the wall time and the number of calls,
+    counters like rowsScanned, indexHits and cacheHits, and per query the wall time, the rows scanned and matched
+    and how often an index or the cache answered it. A disabled profiler records nothing, so it can be called unconditionally"""
+    def __init__ (self, inEnabled=True):
+        self.enabled = inEnabled
+        self.stages = {}
+        self.counters = {}
+        self.queries = {}
+
+    def Start (self):
+        return time.time ()
+
+    def Stop (self, inStage, inStart):
+        """Add the time since inStart, which was returned by Start, to a stage"""
+        if not self.enabled:
+            return
+        stage = self.stages.setdefault (inStage, {'time': 0.0, 'calls': 0})
+        stage ['time'] += time.time () - inStart
+        stage ['calls'] += 1
+
+    def Count (self, inCounter, inCount=1):
+        if self.enabled:
+            self.counters [inCounter] = self.counters.get (inCounter, 0) + inCount
+
+    def AddQuery (self, inLabel, inTime, inRowsScanned, inRowsMatched, inIndexHit=False, inCacheHit=False):
+        """Add a run of a query to its statistics"""
+        if not self.enabled:
+            return
+        query = self.queries.setdefault (inLabel, {'time': 0.0, 'runs': 0, 'rowsScanned': 0, 'rowsMatched': 0, 'indexHits': 0, 'cacheHits': 0})
+        query ['time'] += inTime
+        query ['runs'] += 1
+        query ['rowsScanned'] += inRowsScanned
+        query ['rowsMatched'] += inRowsMatched
+        query ['indexHits'] += int (inIndexHit)
+        query ['cacheHits'] += int (inCacheHit)
+
+    def GetStats (self):
+        return {'stages': self.stages, 'counters': self.counters, 'queries': self.queries}
+
+    def GetSlowestQueries (self, inCount=10):
+        """Return the labels of the inCount queries which took the most time"""
+        return sorted (self.queries, key=lambda label: self.queries [label]['time'], reverse=True) [:inCount]
+
+    def ToJson (self, inFilename=None):
+        """Return the statistics as JSON, and write them to inFilename when it is given"""
+        text = json.dumps (self.GetStats (), indent=2, sort_keys=True)
+        if inFilename:
+            with open (inFilename, 'w') as jsonFile:
+                jsonFile.write (text)
+        return text
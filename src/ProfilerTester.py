@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+import unittest
+import logging
+import os
+import shutil
+import tempfile
+from Profiler import Profiler
+
+# setup logger
+logging.basicConfig(format='%(asctime)-15s %(message)s', filename='ProfilerTester.log')
+logger = logging.getLogger(__name__)
+
+
+class ProfilerTester(unittest.TestCase):
+
+    def setUp(self):
+        self.profiler = Profiler ()
+
+    def testRecord (self):
+        """Stages, counters and queries should be added up"""
+        for k in range (2):
+            self.profiler.Stop ('load', self.profiler.Start ())
+            self.profiler.Count ('rowsScanned', 10)
+        self.profiler.AddQuery ('a', 0.5, 10, 2, inIndexHit=True)
+        self.profiler.AddQuery ('a', 0.25, 0, 2, inCacheHit=True)
+        self.profiler.AddQuery ('b', 1.0, 10, 0)
+        stats = self.profiler.GetStats ()
+        self.assertEqual (2, stats ['stages'] ['load'] ['calls'])
+        self.assertEqual ({'rowsScanned': 20}, stats ['counters'])
+        self.assertEqual ({'time': 0.75, 'runs': 2, 'rowsScanned': 10, 'rowsMatched': 4, 'indexHits': 1, 'cacheHits': 1}, stats ['queries'] ['a'])
+        self.assertEqual (['b', 'a'], self.profiler.GetSlowestQueries ())
+
+    def testDisabled (self):
+        """A disabled profiler should record nothing"""
+        profiler = Profiler (False)
+        profiler.Stop ('load', profiler.Start ())
+        profiler.Count ('rowsScanned')
+        profiler.AddQuery ('a', 0.5, 10, 2)
+        self.assertEqual ({'stages': {}, 'counters': {}, 'queries': {}}, profiler.GetStats ())
+
+    def testToJson (self):
+        """The statistics should be written as JSON"""
+        directory = tempfile.mkdtemp ()
+        try:
+            filename = os.path.join (directory, 'stats.json')
+            self.profiler.Count ('cacheHits')
+            text = self.profiler.ToJson (filename)
+            self.assertEqual (text, open (filename).read ())
+            self.assertTrue ('"cacheHits": 1' in text)
+        finally:
+            shutil.rmtree (directory)
+
+if __name__ == '__main__':
+    unittest.main()
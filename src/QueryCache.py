@@ -0,0 +1,74 @@
+import logging
+import marshal
+import os
+from array import array
+from collections import OrderedDict
+logger = logging.getLogger(__name__)
+
+class QueryCache:
+    """Cache of the rows matching a query, keyed by the fingerprint of the table and the canonical query (see CsvTool.RunQueries).
+    The least recently used results are evicted when the row ids of all results take more than inMaxBytes.
+    With inFilename the cache is read from that file and written to it by Save, so it is kept between runs"""
+    VERSION = 1
+
+    def __init__ (self, inMaxBytes=64 << 20, inFilename=None):
+        self.maxBytes = inMaxBytes
+        self.filename = inFilename
+        self.entries = OrderedDict ()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        if self.filename and os.path.exists (self.filename):
+            self.__Load ()
+
+    def Get (self, inKey):
+        """Return the rows of a cached query as an array, or None when it is not cached"""
+        rows = self.entries.pop (inKey, None)
+        if rows is None:
+            self.misses += 1
+            return None
+        # put it back as most recently used
+        self.entries [inKey] = rows
+        self.hits += 1
+        return rows
+
+    def Put (self, inKey, inRows):
+        rows = array ('l', inRows)
+        size = self.__GetSize (rows)
+        if size > self.maxBytes:
+            return
+        if inKey in self.entries:
+            self.bytes -= self.__GetSize (self.entries.pop (inKey))
+        self.entries [inKey] = rows
+        self.bytes += size
+        while self.bytes > self.maxBytes:
+            key, evicted = self.entries.popitem (last=False)
+            self.bytes -= self.__GetSize (evicted)
+
+    def Save (self):
+        """Write the cache to its file, from the least to the most recently used result"""
+        if not self.filename:
+            return
+        data = [(key, rows.tostring ()) for key, rows in self.entries.items ()]
+        # write to a temporary file first, so the cache file is never half written
+        temporaryFilename = self.filename + '.tmp'
+        with open (temporaryFilename, 'wb') as cacheFile:
+            marshal.dump ((self.VERSION, data), cacheFile, 2)
+        os.rename (temporaryFilename, self.filename)
+
+    def __Load (self):
+        try:
+            with open (self.filename, 'rb') as cacheFile:
+                version, data = marshal.load (cacheFile)
+        except (EOFError, ValueError, TypeError):
+            logger.error ("Query cache %s is corrupt, it is ignored", self.filename)
+            return
+        if version != self.VERSION:
+            return
+        for key, rowData in data:
+            rows = array ('l')
+            rows.fromstring (rowData)
+            self.Put (key, rows)
+
+    def __GetSize (self, inRows):
+        return len (inRows) * inRows.itemsize
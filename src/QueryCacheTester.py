@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+import unittest
+import logging
+import os
+import shutil
+import tempfile
+from QueryCache import QueryCache
+
+# setup logger
+logging.basicConfig(format='%(asctime)-15s %(message)s', filename='QueryCacheTester.log')
+logger = logging.getLogger(__name__)
+
+
+class QueryCacheTester(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp ()
+        self.filename = os.path.join (self.directory, 'queries.marshal')
+
+    def tearDown(self):
+        shutil.rmtree (self.directory)
+
+    def testGetPut (self):
+        """A cached result should be returned until it is evicted as least recently used"""
+        cache = QueryCache (inMaxBytes=3 * 8)
+        cache.Put ('a', [1, 2])
+        cache.Put ('b', [3])
+        self.assertEqual ([1, 2], list (cache.Get ('a')))
+        cache.Put ('c', [4])
+        self.assertEqual (None, cache.Get ('b'))
+        self.assertEqual ([1, 2], list (cache.Get ('a')))
+        self.assertEqual ([4], list (cache.Get ('c')))
+        cache.Put ('d', range (5))
+        self.assertEqual (None, cache.Get ('d'))
+        self.assertEqual ((3, 2), (cache.hits, cache.misses))
+
+    def testSave (self):
+        """A saved cache should be read again from its file"""
+        cache = QueryCache (inFilename=self.filename)
+        cache.Put (('fingerprint', ('==', 'AfBij', 'Af')), [0, 5])
+        cache.Save ()
+        cache = QueryCache (inFilename=self.filename)
+        self.assertEqual ([0, 5], list (cache.Get (('fingerprint', ('==', 'AfBij', 'Af')))))
+
+if __name__ == '__main__':
+    unittest.main()
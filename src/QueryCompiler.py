@@ -0,0 +1,241 @@
+import datetime
+import logging
+from AhoCorasick import AhoCorasick
+logger = logging.getLogger(__name__)
+
+def FormatCents (inCents):
+    """Format an amount in integer cents as euros with 2 decimals, like the amounts in the CSV files"""
+    return '%s%d.%02d' % ('-' if inCents < 0 else '', abs (inCents) // 100, abs (inCents) % 100)
+
+class QueryCompiler:
+    """Compiles the XML queries of IngTool into a query tree and the query tree into a python predicate.
+    A query tree is built from tuples, so it can be compared and used as key in a dict:
+        ('and', (child, child, ...))
+        ('or', (child, child, ...))
+        ('==', HEADER, VALUE)
+        ('in', HEADER, VALUE)
+        ('<' | '<=' | '>' | '>=', HEADER, VALUE)
+    The predicate is compiled once and takes a typed row (list) as argument"""
+    # the minimal number of substrings of the same column for which an AhoCorasick automaton is used,
+    # below this checking every substring with 'in' is faster than the automaton written in python
+    MIN_AUTOMATON_PATTERNS = 128
+    RANGE_OPERATORS = ('<', '<=', '>', '>=')
+
+    def __init__ (self, inAccounts=None):
+        self.accounts = {}
+        if inAccounts:
+            self.accounts = inAccounts
+
+    def ConvertQueryToTree (self, inQuery):
+        """Convert a <query> element to a query tree, this is the tree version of IngTool.ConvertQueryToStringRecursive.
+        Account names in Tegenrekening are replaced by their account number.
+        An element with the attribute compare, e.g. <and Datum="20130101" compare="&gt;="/>, is a range term"""
+        children = []
+        logic = None
+        for logic in inQuery:
+            if logic.attrib:
+                equal = True
+                if "equal" in logic.attrib.keys ():
+                    equal = (logic.attrib['equal'] == "True")
+
+                compare = logic.attrib.get ("compare")
+                if compare is not None and compare not in self.RANGE_OPERATORS:
+                    logger.error ("Unknown compare %s in query", compare)
+                    raise ValueError ("Unknown compare %s in query" % compare)
+
+                for key, value in logic.attrib.items():
+                    if key not in ("equal", "compare"):
+                        if compare:
+                            children.append ((compare, key, value))
+                        elif equal:
+                            if key == 'Tegenrekening' and value in self.accounts:
+                                value = self.accounts [value]
+                            children.append (('==', key, value))
+                        else:
+                            children.append (('in', key, value))
+            else:
+                children.append (self.ConvertQueryToTree (logic))
+
+        tag = 'and'
+        if logic is not None:
+            tag = logic.tag
+        return (tag, tuple (children))
+
+    def BuildPredicate (self, inTree, inHeaders, inColTypes, inMatchers=None, inDictionaries=None):
+        """Return a function which evaluates the query tree on a typed row.
+        The tree is converted to python source once, with the values of the query converted to the type of their column.
+        An or-group with at least MIN_AUTOMATON_PATTERNS substrings of the same column is evaluated by one AhoCorasick automaton.
+        inMatchers is an optional dict from header to an AhoCorasick automaton shared by several queries, the substring
+        terms of these columns are looked up in the matches of the shared automaton, so every cell is scanned only once.
+        inDictionaries is an optional dict from header to the DictionaryColumn of a dictionary-encoded column, of which the row
+        holds the code instead of the string. An equality term on such a column compares the code of its value, which is looked up
+        when compiling, the other terms are evaluated once per distinct value to the set of matching codes"""
+        constants = []
+        if inMatchers is None:
+            inMatchers = {}
+        if inDictionaries is None:
+            inDictionaries = {}
+        source = self.__ConvertTreeToSource (inTree, inHeaders, inColTypes, inMatchers, inDictionaries, constants)
+        code = compile ('lambda row, c=c: ' + source, '<query>', 'eval')
+        return eval (code, {'c': constants})
+
+    def Canonicalize (self, inTree, inColTypes=None):
+        """Return the canonical form of a query tree, which is the same for equivalent queries:
+        the values are converted to the type of their column (with inColTypes), nested and/or of the same operator
+        are flattened, the children are sorted and duplicate children removed.
+        Without inColTypes the canonical form is still a query tree which can be compiled"""
+        operator = inTree [0]
+        if operator in ('and', 'or'):
+            children = set ()
+            for child in inTree [1]:
+                child = self.Canonicalize (child, inColTypes)
+                if child [0] == operator:
+                    children.update (child [1])
+                else:
+                    children.add (child)
+            if len (children) == 1:
+                return children.pop ()
+            return (operator, tuple (sorted (children)))
+        if operator == 'in' or inColTypes is None:
+            return (operator, inTree [1], str (inTree [2]))
+        return (operator, inTree [1], self.ConvertValue (inTree [2], inColTypes.get (inTree [1])))
+
+    def GetSubstrings (self, inTree, outSubstrings=None):
+        """Return a dict from header to the set of substrings of the 'in' terms of the query tree"""
+        if outSubstrings is None:
+            outSubstrings = {}
+        if inTree [0] in ('and', 'or'):
+            for child in inTree [1]:
+                self.GetSubstrings (child, outSubstrings)
+        elif inTree [0] == 'in':
+            outSubstrings.setdefault (inTree [1], set ()).add (str (inTree [2]))
+        return outSubstrings
+
+    def GetColumns (self, inTree, outColumns=None):
+        """Return the set of columns used by the terms of the query tree"""
+        if outColumns is None:
+            outColumns = set ()
+        if inTree [0] in ('and', 'or'):
+            for child in inTree [1]:
+                self.GetColumns (child, outColumns)
+        else:
+            outColumns.add (inTree [1])
+        return outColumns
+
+    def __ConvertTreeToSource (self, inTree, inHeaders, inColTypes, inMatchers, inDictionaries, outConstants):
+        operator = inTree [0]
+        if operator in ('and', 'or'):
+            children = list (inTree [1])
+            terms = []
+            if operator == 'or':
+                terms = self.__ConvertSubstringGroupsToSource (children, inHeaders, inColTypes, inMatchers, inDictionaries, outConstants)
+            terms += [self.__ConvertTreeToSource (child, inHeaders, inColTypes, inMatchers, inDictionaries, outConstants) for child in children]
+            if not terms:
+                # an empty and is always true, an empty or always false
+                return str (operator == 'and')
+            return '(' + (' ' + operator + ' ').join (terms) + ')'
+
+        header, value = inTree [1], inTree [2]
+        cell = self.__GetCellSource (header, inHeaders)
+        colType = inColTypes [header]
+
+        if header in inDictionaries:
+            return self.__ConvertCodeTermToSource (inTree, cell, inDictionaries [header], outConstants)
+        if operator == '==':
+            outConstants.append (self.ConvertValue (value, colType))
+            return '%s == c[%d]' % (cell, len (outConstants) - 1)
+        elif operator in self.RANGE_OPERATORS:
+            outConstants.append (self.ConvertValue (value, colType))
+            # empty cells are None, which python 2 orders before every number
+            return '(%s is not None and %s %s c[%d])' % (cell, cell, operator, len (outConstants) - 1)
+        elif operator == 'in':
+            outConstants.append (str (value))
+            if colType == 'cents':
+                # the substring is searched in the amount in euros, not in the cents
+                outConstants.append (FormatCents)
+                return '(%s is not None and c[%d] in c[%d] (%s))' % (cell, len (outConstants) - 2, len (outConstants) - 1, cell)
+            if colType != 'str':
+                # empty cells of numeric columns are None and never contain anything
+                return '(%s is not None and c[%d] in str (%s))' % (cell, len (outConstants) - 1, cell)
+            if header in inMatchers:
+                outConstants.append (inMatchers [header].GetMatches)
+                return 'c[%d] in c[%d] (%s)' % (len (outConstants) - 2, len (outConstants) - 1, cell)
+            return 'c[%d] in %s' % (len (outConstants) - 1, cell)
+        else:
+            raise ValueError ("Unknown operator %s in query" % operator)
+
+    def __ConvertCodeTermToSource (self, inTree, inCell, inDictionary, outConstants):
+        """Convert a term on a dictionary-encoded column, of which the cell is a code, see BuildPredicate"""
+        operator, value = inTree [0], inTree [2]
+        if operator == '==':
+            # a value which is in no cell gets a code which is in no cell either
+            code = inDictionary.GetCode (value)
+            outConstants.append (-1 if code is None else code)
+            return '%s == c[%d]' % (inCell, len (outConstants) - 1)
+        IsMatch = self.BuildPredicate ((operator, 'value', value), ['value'], {'value': 'str'})
+        outConstants.append (frozenset (code for code, cell in enumerate (inDictionary.values) if IsMatch ([cell])))
+        return '%s in c[%d]' % (inCell, len (outConstants) - 1)
+
+    def __ConvertSubstringGroupsToSource (self, ioChildren, inHeaders, inColTypes, inMatchers, inDictionaries, outConstants):
+        """Convert the groups of at least MIN_AUTOMATON_PATTERNS substring terms on the same string column to one term each.
+        The grouped terms are removed from ioChildren"""
+        groups = {}
+        for child in ioChildren:
+            if child [0] == 'in' and inColTypes.get (child [1]) == 'str':
+                groups.setdefault (child [1], []).append (child)
+
+        terms = []
+        for header, group in sorted (groups.items ()):
+            if len (group) < self.MIN_AUTOMATON_PATTERNS:
+                continue
+            for child in group:
+                ioChildren.remove (child)
+            cell = self.__GetCellSource (header, inHeaders)
+            substrings = [str (child [2]) for child in group]
+            if header in inDictionaries:
+                # the distinct values are matched once, a cell matches the group when its code is in the set of matching codes
+                ContainsAny = AhoCorasick (substrings).ContainsAny
+                outConstants.append (frozenset (code for code, value in enumerate (inDictionaries [header].values) if ContainsAny (value)))
+                terms.append ('%s in c[%d]' % (cell, len (outConstants) - 1))
+            elif header in inMatchers:
+                # a cell matches the group when it shares a match with the substrings of the group
+                outConstants.append (frozenset (substrings))
+                outConstants.append (inMatchers [header].GetMatches)
+                terms.append ('not c[%d].isdisjoint (c[%d] (%s))' % (len (outConstants) - 2, len (outConstants) - 1, cell))
+            else:
+                outConstants.append (AhoCorasick (substrings).ContainsAny)
+                terms.append ('c[%d] (%s)' % (len (outConstants) - 1, cell))
+        return terms
+
+    def __GetCellSource (self, inHeader, inHeaders):
+        if inHeader not in inHeaders:
+            logger.error ("Unknown column %s in query", inHeader)
+            raise ValueError ("Unknown column %s in query" % inHeader)
+        return 'row[%d]' % inHeaders.index (inHeader)
+
+    def ConvertValue (self, inValue, inColType):
+        """Convert a value of a query to the type of the column, values which cannot be converted are kept as they are"""
+        try:
+            if inColType == 'int':
+                # a non-integral value stays a float, so 'Int < 1.5' still matches 1
+                value = float (inValue)
+                if value.is_integer ():
+                    return int (value)
+                return value
+            elif inColType == 'float':
+                return float (inValue)
+            elif inColType == 'cents':
+                # an amount between two cents stays a float, so 'BedragEUR > 11.735' still matches 11.74,
+                # the rounding only removes the error of the double
+                value = round (float (inValue) * 100, 6)
+                if value.is_integer ():
+                    return int (value)
+                return value
+            elif inColType == 'date':
+                # date columns contain int YYYYMMDD, see CsvTool
+                if str (inValue).isdigit ():
+                    return int (inValue)
+                return int (datetime.datetime.strptime (inValue, '%b %d, %Y').strftime ('%Y%m%d'))
+        except ValueError:
+            pass
+        return inValue
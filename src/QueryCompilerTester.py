@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+import unittest
+import logging
+import xml.etree.ElementTree as ElementTree
+from AhoCorasick import AhoCorasick
+from DictionaryColumn import DictionaryColumn
+from QueryCompiler import QueryCompiler, FormatCents
+
+# setup logger
+logging.basicConfig(format='%(asctime)-15s %(message)s', filename='QueryCompilerTester.log')
+logger = logging.getLogger(__name__)
+
+
+class QueryCompilerTester(unittest.TestCase):
+
+    def setUp(self):
+        self.compiler = QueryCompiler ({'ashgard':'1234', 'gerdien':'4321'})
+        self.headers = ['AfBij', 'Tegenrekening', 'Mededelingen', 'BedragEUR']
+        self.colTypes = {'AfBij':'str', 'Tegenrekening':'int', 'Mededelingen':'str', 'BedragEUR':'float'}
+
+    def testConvertQueryToTree (self):
+        """The XML query should be converted to a tree with the account names replaced by their number"""
+        query = ElementTree.fromstring ("""
+            <query name="uitgaven">
+                <and AfBij="Af"/>
+                <and Tegenrekening="ashgard"/>
+                <and>
+                    <or Mededelingen="gamma" equal="False"/>
+                    <or Mededelingen="formido" equal="True"/>
+                </and>
+            </query>""")
+        expected = ('and', (('==', 'AfBij', 'Af'), ('==', 'Tegenrekening', '1234'),
+                            ('or', (('in', 'Mededelingen', 'gamma'), ('==', 'Mededelingen', 'formido')))))
+        actual = self.compiler.ConvertQueryToTree (query)
+        self.assertEqual (expected, actual)
+
+    def testBuildPredicate (self):
+        """The predicate should compare the typed values of a row with the values of the query converted to the column type"""
+        tree = ('and', (('==', 'AfBij', 'Af'), ('or', (('in', 'Mededelingen', 'gamma'), ('==', 'Tegenrekening', '1234')))))
+        predicate = self.compiler.BuildPredicate (tree, self.headers, self.colTypes)
+        self.assertEqual (True, predicate (['Af', None, 'GAMMA gamma', 1.0]))
+        self.assertEqual (True, predicate (['Af', 1234, '', 1.0]))
+        self.assertEqual (False, predicate (['Bij', 1234, 'gamma', 1.0]))
+        self.assertEqual (False, predicate (['Af', 4321, 'GAMMA', 1.0]))
+
+        predicate = self.compiler.BuildPredicate (('==', 'BedragEUR', '0.10'), self.headers, self.colTypes)
+        self.assertEqual (True, predicate (['Af', None, '', 0.1]))
+
+        # a non-integral value never equals a cell of an int column
+        predicate = self.compiler.BuildPredicate (('==', 'Tegenrekening', '1234.5'), self.headers, self.colTypes)
+        self.assertEqual ([False, False], [predicate (['Af', account, '', 1.0]) for account in (1234, 1235)])
+        self.assertEqual (('==', 'Tegenrekening', 1234.5), self.compiler.Canonicalize (('==', 'Tegenrekening', '1234.5'), self.colTypes))
+
+    def testRange (self):
+        """A query with compare should give a range term, which never matches an empty cell"""
+        query = ElementTree.fromstring ('<query name="groot"><and BedragEUR="500" compare="&gt;"/><and AfBij="Af"/></query>')
+        tree = self.compiler.ConvertQueryToTree (query)
+        self.assertEqual (('and', (('>', 'BedragEUR', '500'), ('==', 'AfBij', 'Af'))), tree)
+        predicate = self.compiler.BuildPredicate (tree, self.headers, self.colTypes)
+        self.assertEqual ([True, False, False], [predicate (['Af', None, '', amount]) for amount in (500.5, 500.0, None)])
+        predicate = self.compiler.BuildPredicate (('<', 'Tegenrekening', '2000'), self.headers, self.colTypes)
+        self.assertEqual ([True, False], [predicate (['Af', account, '', 1.0]) for account in (1234, None)])
+        
+        query = ElementTree.fromstring ('<query name="groot"><and BedragEUR="500" compare="=&gt;"/></query>')
+        self.assertRaises (ValueError, self.compiler.ConvertQueryToTree, query)
+
+    def testCanonicalize (self):
+        """Equivalent query trees should have the same canonical form"""
+        tree = ('and', (('==', 'AfBij', 'Af'), ('and', (('==', 'Tegenrekening', '1234'), ('in', 'Mededelingen', 'gamma')))))
+        other = ('and', (('in', 'Mededelingen', 'gamma'), ('==', 'Tegenrekening', '1234.0'), ('or', (('==', 'AfBij', 'Af'),))))
+        expected = ('and', (('==', 'AfBij', 'Af'), ('==', 'Tegenrekening', 1234), ('in', 'Mededelingen', 'gamma')))
+        self.assertEqual (expected, self.compiler.Canonicalize (tree, self.colTypes))
+        self.assertEqual (expected, self.compiler.Canonicalize (other, self.colTypes))
+
+    def testSubstringGroup (self):
+        """An or-group of many substrings of the same column should give the same result with an automaton"""
+        shops = ['gamma', 'formido', 'praxis', 'intratuin']
+        tree = ('and', (('==', 'AfBij', 'Af'), ('or', tuple (('in', 'Mededelingen', shop) for shop in shops) + (('==', 'Tegenrekening', '1234'),))))
+        self.assertEqual ({'Mededelingen': set (shops)}, self.compiler.GetSubstrings (tree))
+        rows = [['Af', None, 'de praxis leiden', 1.0], ['Af', 1234, '', 1.0], ['Af', None, 'albert heijn', 1.0], ['Bij', None, 'gamma', 1.0]]
+        expected = [True, True, False, False]
+        
+        self.compiler.MIN_AUTOMATON_PATTERNS = 2
+        predicate = self.compiler.BuildPredicate (tree, self.headers, self.colTypes)
+        self.assertEqual (expected, [predicate (row) for row in rows])
+        
+        matchers = {'Mededelingen': AhoCorasick (shops + ['albert'])}
+        predicate = self.compiler.BuildPredicate (tree, self.headers, self.colTypes, matchers)
+        self.assertEqual (expected, [predicate (row) for row in rows])
+        predicate = self.compiler.BuildPredicate (('in', 'Mededelingen', 'albert'), self.headers, self.colTypes, matchers)
+        self.assertEqual ([False, False, True, False], [predicate (row) for row in rows])
+
+    def testDictionaries (self):
+        """Terms on a dictionary-encoded column should be evaluated on the codes of its cells"""
+        shops = ['gamma', 'formido', 'praxis']
+        dictionaries = {'AfBij': DictionaryColumn (['Af', 'Bij']), 'Mededelingen': DictionaryColumn (['de praxis leiden', '', 'albert heijn', 'gamma'])}
+        tree = ('and', (('==', 'AfBij', 'Af'), ('or', tuple (('in', 'Mededelingen', shop) for shop in shops) + (('==', 'Tegenrekening', '1234'),))))
+        rows = [[0, None, 0, 1.0], [0, 1234, 1, 1.0], [0, None, 2, 1.0], [1, None, 3, 1.0]]
+        expected = [True, True, False, False]
+        predicate = self.compiler.BuildPredicate (tree, self.headers, self.colTypes, inDictionaries=dictionaries)
+        self.assertEqual (expected, [predicate (row) for row in rows])
+        self.compiler.MIN_AUTOMATON_PATTERNS = 2
+        predicate = self.compiler.BuildPredicate (tree, self.headers, self.colTypes, inDictionaries=dictionaries)
+        self.assertEqual (expected, [predicate (row) for row in rows])
+        
+        predicate = self.compiler.BuildPredicate (('==', 'AfBij', 'Foo'), self.headers, self.colTypes, inDictionaries=dictionaries)
+        self.assertEqual ([False, False], [predicate (row) for row in rows [2:]])
+        predicate = self.compiler.BuildPredicate (('>=', 'Mededelingen', 'b'), self.headers, self.colTypes, inDictionaries=dictionaries)
+        self.assertEqual ([True, False, False, True], [predicate (row) for row in rows])
+
+    def testFormatCents (self):
+        """Amounts in cents should be formatted as euros with 2 decimals"""
+        self.assertEqual (['11.74', '0.05', '-0.05', '-120.00'], [FormatCents (cents) for cents in (1174, 5, -5, -12000)])
+
+    def testUnknownColumn (self):
+        """A query on a column which does not exist should raise an error when it is compiled"""
+        self.assertRaises (ValueError, self.compiler.BuildPredicate, ('==', 'Foo', '1'), self.headers, self.colTypes)
+
+if __name__ == '__main__':
+    unittest.main()
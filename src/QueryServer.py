@@ -0,0 +1,161 @@
+import json
+import logging
+import os
+import socket
+import SocketServer
+import sys
+import threading
+from IngTool import IngTool
+logger = logging.getLogger(__name__)
+
+def SendRequest (inAddress, inRequest):
+    """Send a request (dict) to a QueryServer at inAddress, a path of a Unix socket or (host, port), and return its response"""
+    if isinstance (inAddress, basestring):
+        connection = socket.socket (socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        connection = socket.socket (socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        connection.connect (inAddress)
+        stream = connection.makefile ('rwb')
+        stream.write (json.dumps (inRequest) + '\n')
+        stream.flush ()
+        return json.loads (stream.readline ())
+    finally:
+        connection.close ()
+
+class QueryRequestHandler (SocketServer.StreamRequestHandler):
+    """Answers the requests of a connection, every line is a request in JSON and gets a line with the response in JSON"""
+    def handle (self):
+        for line in iter (self.rfile.readline, ''):
+            try:
+                response = self.server.queryServer.HandleRequest (json.loads (line))
+            except ValueError, e:
+                response = {'error': str (e)}
+            self.wfile.write (json.dumps (response) + '\n')
+            self.wfile.flush ()
+
+class ThreadingUnixStreamServer (SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+class ThreadingTCPServer (SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class QueryServer:
+    """Keeps an IngTool with its typed table, indexes and query cache in memory and answers requests over a local socket,
+    so a question does not pay for starting python and loading the CSV files again. The requests are dicts:
+        {'command': 'report', 'queries': QUERYFILE}                   the result of IngTool.RunQueriesFromFile
+        {'command': 'group', 'queries': QUERYFILE, 'period': PERIOD}  the result of IngTool.GroupQueriesFromFile
+        {'command': 'query', 'query': '<query ...>...</query>'}       the aggregates of an ad-hoc query, see IngTool.RunQuery
+        {'command': 'stats'}                                          the statistics of the profiler, see IngTool.GetStats
+        {'command': 'reload'}                                         load the table again
+    The response is {'result': RESULT}, or {'error': MESSAGE} when the request failed.
+    Before every request the CSV files and the query files are checked for changes. The rows added to changed CSV files
+    are appended with IngTool.UpdateFromFiles when the tool has a transaction store, otherwise the table is loaded again.
+    The reports are kept until their query file or the table changes"""
+    def __init__ (self, inIngTool, inQueryFiles=()):
+        self.ing = inIngTool
+        self.queryFiles = list (inQueryFiles)
+        # the requests are answered one at a time, the connections are handled by threads
+        self.lock = threading.Lock ()
+        self.signatures = {}
+        self.reports = {}
+        self.server = None
+
+    def Load (self):
+        """Load the table and run the query files, so the first requests are answered from memory"""
+        with self.lock:
+            self.__Refresh ()
+            for queryFile in self.queryFiles:
+                self.__GetReport (queryFile)
+
+    def HandleRequest (self, inRequest):
+        """Answer a request (dict) and return the response (dict)"""
+        with self.lock:
+            try:
+                return {'result': self.__HandleRequest (inRequest)}
+            except (AssertionError, EnvironmentError, KeyError, SyntaxError, TypeError, ValueError), e:
+                logger.error ("Request %r failed: %s", inRequest, e)
+                return {'error': '%s: %s' % (e.__class__.__name__, e)}
+
+    def __HandleRequest (self, inRequest):
+        if not isinstance (inRequest, dict) or not isinstance (inRequest.get ('command'), basestring):
+            raise ValueError ("A request has to be an object with a command")
+        command = inRequest ['command']
+        if command == 'reload':
+            self.ing.Reload ()
+            self.reports = {}
+        self.__Refresh ()
+        if command == 'report':
+            return self.__GetReport (inRequest ['queries'])
+        elif command == 'group':
+            return self.ing.GroupQueriesFromFile (inRequest ['queries'], inRequest.get ('period', 'month'))
+        elif command == 'query':
+            return self.ing.RunQuery (inRequest ['query'])
+        elif command == 'stats':
+            return self.ing.GetStats ()
+        elif command == 'reload':
+            return self.ing.csv.GetRowCount ()
+        raise ValueError ("Unknown command %s" % command)
+
+    def __Refresh (self):
+        """Take the changes of the CSV files into account, and load the table when it is not loaded"""
+        signatures = dict ((filename, self.__GetSignature (filename)) for filename in self.ing.files)
+        if self.ing.csv and signatures != self.signatures:
+            if self.ing.store:
+                logger.info ("CSV files changed, %d rows added", self.ing.UpdateFromFiles ())
+            else:
+                logger.info ("CSV files changed, the table is loaded again")
+                self.ing.Reload ()
+                self.reports = {}
+        self.signatures = signatures
+        self.ing.LoadTable ()
+
+    def __GetReport (self, inXmlfile):
+        """Return the result of a query file, it is run again when the file changed"""
+        signature = self.__GetSignature (inXmlfile)
+        report = self.reports.get (inXmlfile)
+        if report is None or report [0] != signature:
+            # a report updated by UpdateFromFiles is the same dict, so it stays up to date
+            self.ing.ForgetQueriesFromFile (inXmlfile)
+            report = self.reports [inXmlfile] = (signature, self.ing.RunQueriesFromFile (inXmlfile))
+        return report [1]
+
+    def __GetSignature (self, inFilename):
+        stat = os.stat (inFilename)
+        return (stat.st_mtime, stat.st_size)
+
+    def Serve (self, inAddress):
+        """Answer requests on inAddress, a path of a Unix socket or (host, port), until Shutdown is called"""
+        if isinstance (inAddress, basestring):
+            if os.path.exists (inAddress):
+                os.remove (inAddress)
+            self.server = ThreadingUnixStreamServer (inAddress, QueryRequestHandler)
+        else:
+            self.server = ThreadingTCPServer (inAddress, QueryRequestHandler)
+        self.server.queryServer = self
+        logger.info ("Serving queries on %s", inAddress)
+        try:
+            self.server.serve_forever ()
+        finally:
+            self.server.server_close ()
+            if isinstance (inAddress, basestring) and os.path.exists (inAddress):
+                os.remove (inAddress)
+
+    def Shutdown (self):
+        """Stop Serve, this has to be called from another thread"""
+        if self.server:
+            self.server.shutdown ()
+
+if __name__ == '__main__':
+    # python QueryServer.py ACCOUNTS FILES SOCKET|HOST:PORT [QUERIES...]
+    ing = IngTool (inCacheDirectory="cache", inProfile=True)
+    ing.LoadAccountsFromFile (sys.argv [1])
+    ing.LoadFilesFromFile (sys.argv [2])
+    address = sys.argv [3]
+    if ':' in address:
+        host, port = address.rsplit (':', 1)
+        address = (host, int (port))
+    server = QueryServer (ing, sys.argv [4:])
+    server.Load ()
+    server.Serve (address)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+import unittest
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from IngTool import IngTool
+from QueryServer import QueryServer, SendRequest
+
+# setup logger
+logging.basicConfig(format='%(asctime)-15s %(message)s', filename='QueryServerTester.log')
+logger = logging.getLogger(__name__)
+
+
+class QueryServerTester(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp ()
+        for filename in ['first.csv', 'second.csv', 'test_queries.xml']:
+            shutil.copy (os.path.join ('test', filename), self.directory)
+        self.queryFile = os.path.join (self.directory, 'test_queries.xml')
+        self.csvFile = os.path.join (self.directory, 'second.csv')
+
+    def tearDown(self):
+        shutil.rmtree (self.directory)
+
+    def __GetServer (self, inStore=None):
+        ing = IngTool (inStore=inStore)
+        ing.LoadAccountsFromFile ("test/test_accounts.xml")
+        ing.files = [os.path.join (self.directory, 'first.csv'), self.csvFile]
+        server = QueryServer (ing, [self.queryFile])
+        server.Load ()
+        return server
+
+    def __GetExpected (self):
+        ing = IngTool ()
+        ing.LoadAccountsFromFile ("test/test_accounts.xml")
+        ing.files = [os.path.join (self.directory, 'first.csv'), self.csvFile]
+        return ing.RunQueriesFromFile (self.queryFile)
+
+    def testRequests (self):
+        """The server should answer reports and ad-hoc queries, and errors should be reported"""
+        server = self.__GetServer ()
+        self.assertEqual ({'result': self.__GetExpected ()}, server.HandleRequest ({'command': 'report', 'queries': self.queryFile}))
+        response = server.HandleRequest ({'command': 'query', 'query': '<query name="a"><and AfBij="Bij"/><and Tegenrekening="ashgard"/></query>'})
+        self.assertEqual ((2, 79863), (response ['result'] ['count'], response ['result'] ['sum']))
+        self.assertEqual (14, server.HandleRequest ({'command': 'reload'}) ['result'])
+        self.assertTrue ('error' in server.HandleRequest ({'command': 'foo'}))
+        self.assertTrue ('error' in server.HandleRequest ({'command': 'query', 'query': '<query'}))
+        self.assertTrue ('error' in server.HandleRequest ({'command': 'report', 'queries': 'nonexisting.xml'}))
+        self.assertTrue ('error' in server.HandleRequest (['report']))
+        self.assertTrue ('error' in server.HandleRequest ({'command': 5}))
+        self.assertTrue ('error' in server.HandleRequest ({'command': 'query', 'query': 5}))
+
+    def testChangedFiles (self):
+        """A changed CSV file or query file should be taken into account by the next request"""
+        for store in [None, os.path.join (self.directory, 'store.csv')]:
+            server = self.__GetServer (store)
+            with open (self.csvFile, 'a') as csvFile:
+                csvFile.write ('20140501,,,1234,OV,Bij,100,Overschrijving,\n')
+            self.assertEqual (self.__GetExpected (), server.HandleRequest ({'command': 'report', 'queries': self.queryFile}) ['result'])
+            self.assertEqual (898.63, server.HandleRequest ({'command': 'report', 'queries': self.queryFile}) ['result'] ['inkomsten'] ['private'] ['ashgard'])
+
+            with open (self.queryFile) as queryFile:
+                queries = queryFile.read ()
+            with open (self.queryFile, 'w') as queryFile:
+                queryFile.write (queries.replace ('gamma', 'Supermarkt'))
+            self.assertEqual (self.__GetExpected (), server.HandleRequest ({'command': 'report', 'queries': self.queryFile}) ['result'])
+            self.assertEqual (11.12, server.HandleRequest ({'command': 'report', 'queries': self.queryFile}) ['result'] ['uitgaven'] ['overige'] ['klussen'])
+            shutil.copy (os.path.join ('test', 'second.csv'), self.directory)
+            shutil.copy (os.path.join ('test', 'test_queries.xml'), self.directory)
+
+    def testServe (self):
+        """Requests should be answered over a Unix socket"""
+        server = self.__GetServer ()
+        address = os.path.join (self.directory, 'socket')
+        thread = threading.Thread (target=server.Serve, args=(address,))
+        thread.start ()
+        try:
+            while not os.path.exists (address):
+                thread.join (0.01)
+            response = SendRequest (address, {'command': 'report', 'queries': self.queryFile})
+            self.assertEqual (self.__GetExpected (), response ['result'])
+            # a malformed request should be answered with an error instead of dropping the connection
+            self.assertTrue ('error' in SendRequest (address, ['report']))
+            self.assertTrue ('error' in SendRequest (address, {'command': 'query', 'query': 5}))
+            self.assertEqual (response, SendRequest (address, {'command': 'report', 'queries': self.queryFile}))
+        finally:
+            server.Shutdown ()
+            thread.join ()
+        self.assertFalse (os.path.exists (address))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+class SortedIndex:
+    """Index of the rows of a numeric or date column ordered by their value.
+    A range of values is found by binary search and its rows are a contiguous slice of the index.
+    Empty cells (None, NaN or the value inNull) are not in the index, they never match a range"""
+    def __init__ (self, inColumn, inNull=None):
+        self.null = inNull
+        pairs = [(value, j) for j, value in enumerate (inColumn) if value is not None and value == value and value != inNull]
+        pairs.sort ()
+        self.values = [value for value, j in pairs]
+        self.rows = array ('l', (j for value, j in pairs))
+
+    def Extend (self, inColumn, inFirstRow):
+        """Add the rows of cells appended to the column, inColumn has the cells from row inFirstRow on.
+        Every value is inserted at its place, which is cheaper than sorting again when few rows are appended"""
+        for j, value in enumerate (inColumn, inFirstRow):
+            if value is None or value != value or value == self.null:
+                continue
+            # the appended rows come after the rows with the same value
+            k = bisect_right (self.values, value)
+            self.values.insert (k, value)
+            self.rows.insert (k, j)
+
+    def GetRows (self, inTerms):
+        """Return the rows of which the value satisfies all terms (OPERATOR, VALUE), OPERATOR is '<', '<=', '>' or '>='"""
+        low, high = 0, len (self.values)
+        for operator, value in inTerms:
+            if operator == '<':
+                high = min (high, bisect_left (self.values, value))
+            elif operator == '<=':
+                high = min (high, bisect_right (self.values, value))
+            elif operator == '>':
+                low = max (low, bisect_right (self.values, value))
+            elif operator == '>=':
+                low = max (low, bisect_left (self.values, value))
+            else:
+                raise ValueError ("Unknown range operator %s" % operator)
+        return self.rows [low:max (low, high)]
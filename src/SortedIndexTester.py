@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+import unittest
+import logging
+from SortedIndex import SortedIndex
+
+# setup logger
+logging.basicConfig(format='%(asctime)-15s %(message)s', filename='SortedIndexTester.log')
+logger = logging.getLogger(__name__)
+
+
+class SortedIndexTester(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SortedIndex ([30, None, 10, 20, -1, 20, 40], -1)
+
+    def testGetRows (self):
+        """A range should give the rows having a value in the range, empty cells are never in a range"""
+        self.assertEqual ([2], list (self.index.GetRows ([('<', 20)])))
+        self.assertEqual ([2, 3, 5], list (self.index.GetRows ([('<=', 20)])))
+        self.assertEqual ([0, 6], list (self.index.GetRows ([('>', 20)])))
+        self.assertEqual ([3, 5, 0, 6], list (self.index.GetRows ([('>=', 20)])))
+        self.assertEqual ([3, 5, 0], list (self.index.GetRows ([('>', 10), ('<=', 30)])))
+        self.assertEqual ([], list (self.index.GetRows ([('>', 30), ('<', 20)])))
+
+    def testNaN (self):
+        """Empty cells of float columns are NaN in the columnar backend and should not be in the index"""
+        index = SortedIndex ([1.5, float ('nan'), 0.5])
+        self.assertEqual ([2, 0], list (index.GetRows ([('>', 0.0)])))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import csv
+import datetime
+import random
+import xml.etree.ElementTree as ElementTree
+
+class StatementGenerator:
+    """Writes synthetic ING CSV exports and query files with many categories, to measure how the tools scale.
+    The rows look like the real exports: payments at shops with a long Mededelingen, cash withdrawals and transfers
+    from and to the accounts of an accounts.xml. The generated categories never overlap, so IngTool accepts them"""
+    HEADER = ['Datum', 'Naam / Omschrijving', 'Rekening', 'Tegenrekening', 'Code', 'Af Bij', 'Bedrag (EUR)', 'MutatieSoort', 'Mededelingen']
+    ACCOUNT = 'NL44 INGB 0000 4938 31'
+    SHOPS = ['ALBERT HEIJN', 'C1000', 'JUMBO', 'GAMMA', 'PRAXIS', 'FORMIDO', 'INTRATUIN', 'HEMA', 'KRUIDVAT', 'BLOKKER',
+             'SLAGERIJ', 'BAKKERIJ', 'ETOS', 'ACTION', 'DE BOSRAND', 'BARSELAAR', 'SHELL', 'NS', 'IKEA', 'MEDIAMARKT']
+    CITIES = ['LEIDEN', 'DEN HAAG', 'UTRECHT', 'AMSTERDAM', 'ROTTERDAM', 'DELFT', 'GOUDA', 'HAARLEM']
+    # the shops of a category, every shop occurs in one category only
+    SHOPS_PER_CATEGORY = 2
+    MAX_CATEGORIES = 1000
+
+    def __init__ (self, inAccountsFile=None, inSeed=0):
+        self.random = random.Random (inSeed)
+        self.accounts = [('ashgard', '1234'), ('gerdien', '4321')]
+        if inAccountsFile:
+            tree = ElementTree.parse (inAccountsFile)
+            self.accounts = [(account.attrib ['name'], account.attrib ['number']) for account in tree.getroot ()]
+        # the shop names end in a number of fixed width, so no shop name is a substring of another one
+        self.shops = ['%s %04d' % (self.SHOPS [k % len (self.SHOPS)], k) for k in range (self.SHOPS_PER_CATEGORY * self.MAX_CATEGORIES)]
+
+    def WriteCsv (self, inFilename, inRows, inStartDate=datetime.date (2011, 1, 1)):
+        """Write an export of inRows rows, with a few rows per day from inStartDate on"""
+        with open (inFilename, 'wb') as csvFile:
+            writer = csv.writer (csvFile)
+            writer.writerow (self.HEADER)
+            date = inStartDate
+            for j in xrange (inRows):
+                if self.random.random () < 0.3:
+                    date += datetime.timedelta (days=1)
+                writer.writerow (self.__GetRow (date))
+
+    def __GetRow (self, inDate):
+        datum = inDate.strftime ('%Y%m%d')
+        time = '%s %02d:%02d' % (inDate.strftime ('%d-%m-%y'), self.random.randint (7, 22), self.random.randint (0, 59))
+        amount = self.__GetAmount ()
+        kind = self.random.random ()
+        if kind < 0.7:
+            shop = self.random.choice (self.shops)
+            mededelingen = '%s / %-16s009 %06d %-16sING BANK NV PASTRANSACTIES' % (shop, self.random.choice (self.CITIES),
+                self.random.randint (0, 999999), '%06X' % self.random.randint (0, 0xFFFFFF))
+            return [datum, time + ' BETAALAUTOMAAT   ', self.ACCOUNT, '', 'BA', 'Af', amount, 'Betaalautomaat', mededelingen]
+        elif kind < 0.8:
+            mededelingen = 'ABN AMRO / %-16s009 %06d AUTOMAATNUMMER %06d ING BANK NV PASTRANSACTIES' % (self.random.choice (self.CITIES),
+                self.random.randint (0, 999999), self.random.randint (0, 999999))
+            return [datum, time + ' GELDAUTOMAAT     ', self.ACCOUNT, '', 'GM', 'Af', amount, 'Geldautomaat', mededelingen]
+        elif kind < 0.95:
+            name, number = self.random.choice (self.accounts)
+            afBij = self.random.choice (['Af', 'Bij'])
+            code, soort = self.random.choice ([('OV', 'Overschrijving'), ('IC', 'Incasso'), ('GT', 'Internetbankieren')])
+            mededelingen = 'BETALINGSKENMERK %016d OMSCHRIJVING %s' % (self.random.randint (0, 10 ** 16 - 1), name.upper ())
+            return [datum, name.upper (), self.ACCOUNT, number, code, afBij, amount, soort, mededelingen]
+        return [datum, 'VERZAMELBETALING', self.ACCOUNT, '', 'VZ', 'Bij', amount, 'Verzamelbetaling', 'UITKERING %06d' % self.random.randint (0, 999999)]
+
+    def __GetAmount (self):
+        """Return an amount like the exports do: 455, 11.74 or 20.5"""
+        amount = '%.2f' % min (self.random.lognormvariate (3, 1.2), 99999)
+        return amount.rstrip ('0').rstrip ('.')
+
+    def WriteQueries (self, inFilename, inCategories):
+        """Write a query file (see IngTool.RunQueriesFromFile) with inCategories categories.
+        A quarter of them (at most 2 per account) are transfers from or to an account, the others payments at shops"""
+        if inCategories > self.MAX_CATEGORIES:
+            raise ValueError ("At most %d categories can be generated" % self.MAX_CATEGORIES)
+        queries = ElementTree.Element ('queries')
+        accountCategories = min (inCategories // 4, 2 * len (self.accounts))
+        for k in range (accountCategories):
+            name, number = self.accounts [k // 2]
+            afBij = ['Af', 'Bij'][k % 2]
+            query = ElementTree.SubElement (queries, 'query', {'name': 'rekeningen', 'subname': name, 'subsubname': afBij})
+            ElementTree.SubElement (query, 'and', {'AfBij': afBij})
+            ElementTree.SubElement (query, 'and', {'Tegenrekening': name})
+        for k in range (inCategories - accountCategories):
+            query = ElementTree.SubElement (queries, 'query', {'name': 'uitgaven', 'subname': 'categorie%04d' % k})
+            ElementTree.SubElement (query, 'and', {'AfBij': 'Af'})
+            shops = ElementTree.SubElement (query, 'and')
+            for shop in self.shops [k * self.SHOPS_PER_CATEGORY:(k + 1) * self.SHOPS_PER_CATEGORY]:
+                ElementTree.SubElement (shops, 'or', {'Mededelingen': shop, 'equal': 'False'})
+        ElementTree.ElementTree (queries).write (inFilename)
+
+    def WriteAccounts (self, inFilename):
+        """Write the accounts of the generated rows to an accounts.xml"""
+        accounts = ElementTree.Element ('accounts')
+        for name, number in self.accounts:
+            ElementTree.SubElement (accounts, 'account', {'name': name, 'number': number})
+        ElementTree.ElementTree (accounts).write (inFilename)
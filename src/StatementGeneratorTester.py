@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+import unittest
+import logging
+import os
+import shutil
+import tempfile
+from CsvTool import CsvTool
+from IngTool import IngTool
+from StatementGenerator import StatementGenerator
+
+# setup logger
+logging.basicConfig(format='%(asctime)-15s %(message)s', filename='StatementGeneratorTester.log')
+logger = logging.getLogger(__name__)
+
+
+class StatementGeneratorTester(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp ()
+        self.generator = StatementGenerator ("test/test_accounts.xml")
+        self.csvFile = os.path.join (self.directory, 'statements.csv')
+        self.generator.WriteCsv (self.csvFile, 500)
+
+    def tearDown(self):
+        shutil.rmtree (self.directory)
+
+    def testWriteCsv (self):
+        """The generated export should be loaded like a real ING export"""
+        csvTool = CsvTool ()
+        csvTool.LoadFile (self.csvFile)
+        self.assertEqual (500, csvTool.GetRowCount ())
+        self.assertEqual (['Datum', 'NaamOmschrijving', 'Rekening', 'Tegenrekening', 'Code', 'AfBij', 'BedragEUR', 'MutatieSoort', 'Mededelingen'], csvTool.headers)
+        self.assertEqual ('date', csvTool.colTypes ['Datum'])
+        self.assertEqual ('float', csvTool.colTypes ['BedragEUR'])
+        self.assertEqual (set (['Af', 'Bij']), csvTool.GetUnique ('AfBij'))
+
+    def testWriteQueries (self):
+        """The generated categories should not overlap"""
+        queryFile = os.path.join (self.directory, 'queries.xml')
+        self.generator.WriteQueries (queryFile, 20)
+        ing = IngTool ()
+        ing.LoadAccountsFromFile ("test/test_accounts.xml")
+        ing.files = [self.csvFile]
+        results = ing.RunQueriesFromFile (queryFile)
+        self.assertEqual (['Af', 'Bij'], sorted (results ['rekeningen']['gerdien'].keys ()))
+        self.assertEqual (16, len (results ['uitgaven']))
+        self.assertEqual (20, len (ing.bitmaps))
+        self.assertRaises (ValueError, self.generator.WriteQueries, queryFile, 1001)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import hashlib
+import logging
+import marshal
+import os
+logger = logging.getLogger(__name__)
+
+class TableCache:
+    """Cache on disk of the typed columns of CSV files, see CsvTool.ReadTypedFile.
+    Every CSV file gets a marshal file in the cache directory, which is used as long as the CSV file is not changed.
+    A CSV file is unchanged when its modification time and size are the same, or when its size and md5 hash are the same"""
+    VERSION = 3
+
+    def __init__ (self, inDirectory):
+        self.directory = inDirectory
+        if not os.path.isdir (self.directory):
+            os.makedirs (self.directory)
+
+    def Get (self, inFilename):
+        """Return the cached result of CsvTool.ReadTypedFile for a CSV file, or None when it is not cached or out of date"""
+        cacheFilename = self.__GetCacheFilename (inFilename)
+        if not os.path.exists (cacheFilename):
+            return None
+        try:
+            with open (cacheFilename, 'rb') as cacheFile:
+                version, signature, data = marshal.load (cacheFile)
+        except (EOFError, ValueError, TypeError):
+            logger.error ("Cache file %s of %s is corrupt, it is ignored", cacheFilename, inFilename)
+            return None
+        if version != self.VERSION:
+            return None
+
+        mtime, size, md5 = signature
+        stat = os.stat (inFilename)
+        if (stat.st_mtime, stat.st_size) == (mtime, size):
+            return data
+        if stat.st_size == size and self.__GetHash (inFilename) == md5:
+            # the file was touched or downloaded again without changes
+            self.Put (inFilename, data, md5)
+            return data
+        return None
+
+    def Put (self, inFilename, inData, inHash=None):
+        """Store the result of CsvTool.ReadTypedFile for a CSV file"""
+        stat = os.stat (inFilename)
+        if inHash is None:
+            inHash = self.__GetHash (inFilename)
+        signature = (stat.st_mtime, stat.st_size, inHash)
+        cacheFilename = self.__GetCacheFilename (inFilename)
+        # write to a temporary file first, so a cache file is never half written
+        temporaryFilename = cacheFilename + '.tmp'
+        with open (temporaryFilename, 'wb') as cacheFile:
+            marshal.dump ((self.VERSION, signature, inData), cacheFile, 2)
+        os.rename (temporaryFilename, cacheFilename)
+
+    def __GetCacheFilename (self, inFilename):
+        key = hashlib.sha1 (os.path.abspath (inFilename)).hexdigest ()
+        return os.path.join (self.directory, key + '.marshal')
+
+    def __GetHash (self, inFilename):
+        md5 = hashlib.md5 ()
+        with open (inFilename, 'rb') as csvFile:
+            for block in iter (lambda: csvFile.read (1 << 20), ''):
+                md5.update (block)
+        return md5.hexdigest ()
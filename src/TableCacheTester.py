@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+import unittest
+import logging
+import os
+import shutil
+import tempfile
+from array import array
+from CsvTool import CsvTool
+from TableCache import TableCache
+
+# setup logger
+logging.basicConfig(format='%(asctime)-15s %(message)s', filename='TableCacheTester.log')
+logger = logging.getLogger(__name__)
+
+
+class TableCacheTester(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp ()
+        self.cache = TableCache (os.path.join (self.directory, 'cache'))
+        self.filename = os.path.join (self.directory, 'first.csv')
+        shutil.copy ('test/first.csv', self.filename)
+
+    def tearDown(self):
+        shutil.rmtree (self.directory)
+
+    def testGetPut (self):
+        """A cached file should be returned as long as it does not change"""
+        self.assertEqual (None, self.cache.Get (self.filename))
+        data = CsvTool ().ReadTypedFile (self.filename)
+        self.cache.Put (self.filename, data)
+        self.assertEqual (data, self.cache.Get (self.filename))
+
+        # touching the file does not change its content
+        os.utime (self.filename, (0, 0))
+        self.assertEqual (data, self.cache.Get (self.filename))
+
+        with open (self.filename, 'a') as csvFile:
+            csvFile.write ('20130501,,,,BA,Af,1.5,Betaalautomaat,\n')
+        self.assertEqual (None, self.cache.Get (self.filename))
+
+    def testLoadFile (self):
+        """Loading files through the cache should give the same table as loading them directly"""
+        files = [self.filename, 'test/second.csv']
+        expected = CsvTool ()
+        expected.LoadFile (files)
+        for k in range (2):
+            actual = CsvTool ()
+            actual.LoadFile (files, inCache=self.cache)
+            self.assertEqual (expected.colTypes, actual.colTypes)
+            self.assertEqual (expected.csvTable, actual.csvTable)
+        self.assertEqual (2, len (os.listdir (self.cache.directory)))
+
+    def testTypedColumns (self):
+        """The cached typed columns should give the same table as loading the files directly, also when the type of a column
+        differs between the files, with given types, loaded columns, a filter and worker processes"""
+        files = [os.path.join (self.directory, name) for name in ['a.csv', 'b.csv']]
+        with open (files [0], 'w') as csvFile:
+            csvFile.write ('A,B,C\n1,x,2.5\n2,y,\n3,z,1.5\n')
+        with open (files [1], 'w') as csvFile:
+            csvFile.write ('A,B,C\n4.5,3,7.5\n')
+        cases = [({}, None), ({'inColTypes': {'C': 'cents'}}, None), ({'inColumns': ['A', 'C']}, None), ({}, ('>', 'A', '1'))]
+        # with one repeat the string columns are dictionary-encoded
+        for repeats in [CsvTool.DICTIONARY_REPEATS, 1]:
+            CsvTool.DICTIONARY_REPEATS, default = repeats, CsvTool.DICTIONARY_REPEATS
+            try:
+                cache = TableCache (os.path.join (self.directory, 'cache%d' % repeats))
+                for columnar in [False, True]:
+                    for processes in [None, 2]:
+                        for settings, tree in cases:
+                            expected = CsvTool (columnar, **settings)
+                            expected.LoadFile (files, inFilter=tree)
+                            for k in range (2):
+                                actual = CsvTool (columnar, **settings)
+                                actual.LoadFile (files, processes, cache, tree)
+                                self.assertEqual (expected.colTypes, actual.colTypes)
+                                self.assertEqual (expected.nullColumns, actual.nullColumns)
+                                self.assertEqual ([expected.GetRow (j) for j in range (expected.GetRowCount ())], [actual.GetRow (j) for j in range (actual.GetRowCount ())])
+                                self.assertEqual ([expected.GetSource (j) for j in range (expected.GetRowCount ())], [actual.GetSource (j) for j in range (actual.GetRowCount ())])
+            finally:
+                CsvTool.DICTIONARY_REPEATS = default
+
+    def testCachedTypes (self):
+        """A cached file should keep its typed columns, so they are not converted again"""
+        data = CsvTool (inColTypes={'BedragEUR': 'cents'}).ReadTypedFile (self.filename)
+        givenTypes, headers, counts, types, columns = data
+        self.assertEqual ([('BedragEUR', 'cents')], givenTypes)
+        self.assertEqual (['date', 'str', 'str', 'int', 'str', 'str', 'cents', 'str', 'str'], types)
+        amounts = array (columns [6] [0])
+        amounts.fromstring (columns [6] [1])
+        self.assertEqual ([45540, 1174, 891, 2000], list (amounts) [:4])
+        # a string column of which the values do not repeat enough is kept as strings
+        self.assertEqual ((None, None, 'Bij'), (columns [5] [0], columns [5] [1], columns [5] [2] [0]))
+        
+        d = CsvTool (True, inColTypes={'BedragEUR': 'cents'})
+        d.LoadFile ([self.filename, 'test/second.csv'], inCache=self.cache)
+        self.assertEqual ('cents', d.colTypes ['BedragEUR'])
+        # the types of cached files depend on the given types
+        d = CsvTool (True)
+        d.LoadFile ([self.filename, 'test/second.csv'], inCache=self.cache)
+        self.assertEqual ('float', d.colTypes ['BedragEUR'])
+        self.assertEqual (11.74, d.GetRow (1) [6])
+
+if __name__ == '__main__':
+    unittest.main()
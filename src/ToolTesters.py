@@ -1,12 +1,42 @@
 from xmlrunner import XMLTestRunner
+import AggregatorTester
+import AhoCorasickTester
+import BenchmarkTester
+import BitmapTester
 import CsvToolTester
+import DictionaryColumnTester
+import HashIndexTester
+import ProfilerTester
+import QueryCacheTester
+import QueryCompilerTester
+import QueryServerTester
+import SortedIndexTester
+import StatementGeneratorTester
+import TableCacheTester
+import TransactionStoreTester
+import TrigramIndexTester
 import unittest
 
 def run_tests ():
     suite = unittest.TestSuite ()
     loader = unittest.TestLoader ()
 
+    suite.addTest (loader.loadTestsFromModule (AggregatorTester))
+    suite.addTest (loader.loadTestsFromModule (AhoCorasickTester))
+    suite.addTest (loader.loadTestsFromModule (BenchmarkTester))
+    suite.addTest (loader.loadTestsFromModule (BitmapTester))
     suite.addTest (loader.loadTestsFromModule (CsvToolTester))
+    suite.addTest (loader.loadTestsFromModule (DictionaryColumnTester))
+    suite.addTest (loader.loadTestsFromModule (HashIndexTester))
+    suite.addTest (loader.loadTestsFromModule (ProfilerTester))
+    suite.addTest (loader.loadTestsFromModule (QueryCacheTester))
+    suite.addTest (loader.loadTestsFromModule (QueryCompilerTester))
+    suite.addTest (loader.loadTestsFromModule (QueryServerTester))
+    suite.addTest (loader.loadTestsFromModule (SortedIndexTester))
+    suite.addTest (loader.loadTestsFromModule (StatementGeneratorTester))
+    suite.addTest (loader.loadTestsFromModule (TableCacheTester))
+    suite.addTest (loader.loadTestsFromModule (TransactionStoreTester))
+    suite.addTest (loader.loadTestsFromModule (TrigramIndexTester))
 
     runner = XMLTestRunner(file('testoutput.xml', "w"))
     result = runner.run(suite)
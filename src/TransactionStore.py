@@ -0,0 +1,110 @@
+import csv
+import logging
+import os
+from CsvTool import CsvTool
+logger = logging.getLogger(__name__)
+
+class TransactionStore:
+    """Append-only store of the transactions read from ING CSV files, the store itself is a CSV file which can be loaded by CsvTool.
+    An export of the current year has to be downloaded again everytime and overlaps the previous download.
+    To ingest only the rows which are not in the store yet, the store keeps per account (column Rekening):
+    - the high-water mark: the last Datum in the store
+    - the fingerprints of the rows on that Datum, with the number of times they occur
+    Rows before the high-water mark are already in the store, rows after it are new,
+    and rows on it are new when their fingerprint occurs more often than in the store.
+    So the files have to be ingested in date order: the rows of an older file which were missed are never ingested"""
+    def __init__ (self, inFilename, inColTypes=None):
+        """inColTypes are the column types given to CsvTool when the store is loaded, e.g. {'BedragEUR': 'cents'}"""
+        self.filename = inFilename
+        self.colTypes = inColTypes
+        self.headers = None
+        self.accounts = {}
+        # the number of rows in the store
+        self.rowCount = 0
+        if os.path.exists (self.filename):
+            self.__ReadState ()
+
+    def __ReadState (self):
+        """Determine the high-water marks and fingerprints from the rows in the store"""
+        csvData = csv.reader (open (self.filename, 'rb'))
+        for row in csvData:
+            if self.headers is None:
+                self.headers = row
+            else:
+                self.__AddToState (row)
+                self.rowCount += 1
+
+    def __AddToState (self, inRow):
+        account = inRow [self.headers.index ('Rekening')]
+        datum = self.__GetDatum (inRow)
+        if datum is None:
+            return
+        highWaterMark, fingerprints = self.accounts.get (account, (None, {}))
+        if datum > highWaterMark:
+            highWaterMark, fingerprints = datum, {}
+        if datum == highWaterMark:
+            fingerprint = self.__GetFingerprint (inRow)
+            fingerprints [fingerprint] = fingerprints.get (fingerprint, 0) + 1
+        self.accounts [account] = (highWaterMark, fingerprints)
+
+    def Ingest (self, inFilename):
+        """Append the rows of a CSV file which are not in the store yet to the store and return them.
+        The rows before the high-water mark of their account are skipped as already stored, files have to be ingested in date order.
+        When a cell of a new row cannot be converted to its column type a ValueError is raised and nothing is appended,
+        otherwise every later load of the store would fail on that cell"""
+        csv = CsvTool (inColTypes=self.colTypes)
+        headers, rows, counts = csv.ReadFile (inFilename)
+        if self.headers is None:
+            self.headers = headers
+        elif headers != self.headers:
+            logger.error ("Header of CSV file %s is not the same as the header of the store %s!", inFilename, self.filename)
+            raise ValueError ("Header of CSV file %s is not the same as the header of the store %s" % (inFilename, self.filename))
+
+        idxRekening = self.headers.index ('Rekening')
+        newRows = []
+        # the number of times a fingerprint on the high-water mark occurs in this file
+        occurrences = {}
+        skipped = 0
+        for row in rows:
+            datum = self.__GetDatum (row)
+            if datum is None:
+                logger.error ("Row without Datum in %s is not ingested: %s", inFilename, row)
+                continue
+            highWaterMark, fingerprints = self.accounts.get (row [idxRekening], (None, {}))
+            if datum > highWaterMark:
+                newRows.append (row)
+            elif datum == highWaterMark:
+                key = (row [idxRekening], self.__GetFingerprint (row))
+                occurrences [key] = occurrences.get (key, 0) + 1
+                if occurrences [key] > fingerprints.get (key [1], 0):
+                    newRows.append (row)
+            else:
+                skipped += 1
+        if skipped:
+            # an overlapping export always has such rows, whether they really are in the store is not known
+            logger.debug ("%d rows of %s are before the high-water mark of their account, they are already stored", skipped, inFilename)
+
+        if newRows:
+            csv.CheckRows (newRows, counts, inFilename)
+            self.__Append (newRows)
+        return newRows
+
+    def __Append (self, inRows):
+        isNew = not os.path.exists (self.filename)
+        with open (self.filename, 'ab') as storeFile:
+            writer = csv.writer (storeFile)
+            if isNew:
+                writer.writerow (self.headers)
+            for row in inRows:
+                writer.writerow (row)
+                self.__AddToState (row)
+                self.rowCount += 1
+
+    def __GetDatum (self, inRow):
+        try:
+            return int (inRow [self.headers.index ('Datum')])
+        except ValueError:
+            return None
+
+    def __GetFingerprint (self, inRow):
+        return '\x1f'.join (inRow)
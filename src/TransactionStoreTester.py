@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+import unittest
+import logging
+import os
+import shutil
+import tempfile
+from CsvTool import CsvTool
+from TransactionStore import TransactionStore
+
+# setup logger
+logging.basicConfig(format='%(asctime)-15s %(message)s', filename='TransactionStoreTester.log')
+logger = logging.getLogger(__name__)
+
+
+class TransactionStoreTester(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp ()
+        self.filename = os.path.join (self.directory, 'store.csv')
+        self.store = TransactionStore (self.filename)
+
+    def tearDown(self):
+        shutil.rmtree (self.directory)
+
+    def __WriteExport (self, inLines):
+        filename = os.path.join (self.directory, 'export.csv')
+        with open (filename, 'w') as export:
+            export.write ('Datum,Naam / Omschrijving,Rekening,Tegenrekening,Code,Af Bij,Bedrag (EUR),MutatieSoort,Mededelingen\n')
+            for line in inLines:
+                export.write (line + '\n')
+        return filename
+
+    def testIngest (self):
+        """Ingesting the same file twice should add its rows only once"""
+        self.assertEqual (7, len (self.store.Ingest ('test/first.csv')))
+        self.assertEqual ([], self.store.Ingest ('test/first.csv'))
+        self.assertEqual (7, len (self.store.Ingest ('test/second.csv')))
+
+        # the state is read again from the store
+        store = TransactionStore (self.filename)
+        self.assertEqual ([], store.Ingest ('test/second.csv'))
+        csv = CsvTool ()
+        csv.LoadFile (self.filename)
+        self.assertEqual (14, csv.GetRowCount ())
+
+    def testOverlap (self):
+        """Of an overlapping export only the rows after the high-water mark, or more often on it, should be new"""
+        self.store.Ingest (self.__WriteExport ([
+            '20130102,,1,,BA,Af,1.5,Betaalautomaat,koffie',
+            '20130101,,1,,BA,Af,3,Betaalautomaat,brood']))
+        newRows = self.store.Ingest (self.__WriteExport ([
+            '20130103,,1,,BA,Af,2,Betaalautomaat,krant',
+            '20130102,,1,,BA,Af,1.5,Betaalautomaat,koffie',
+            '20130102,,1,,BA,Af,1.5,Betaalautomaat,koffie',
+            '20130102,,2,,BA,Af,1.5,Betaalautomaat,koffie',
+            '20130101,,1,,BA,Af,3,Betaalautomaat,brood']))
+        self.assertEqual (['krant', 'koffie', 'koffie'], [row [8] for row in newRows])
+        self.assertEqual (['1', '1', '2'], [row [2] for row in newRows])
+        self.assertEqual ((20130103, 1), (self.store.accounts ['1'][0], len (self.store.accounts ['1'][1])))
+
+    def testRejectFile (self):
+        """A file with a cell which cannot be converted should not be ingested at all, so the store can still be loaded"""
+        store = TransactionStore (self.filename, {'BedragEUR': 'cents'})
+        store.Ingest (self.__WriteExport (['20130101,,1,,BA,Af,3,Betaalautomaat,brood']))
+        export = self.__WriteExport ([
+            '20130102,,1,,BA,Af,2,Betaalautomaat,krant',
+            '20130102,,1,,BA,Af,1x5,Betaalautomaat,koffie'])
+        self.assertRaises (ValueError, store.Ingest, export)
+        self.assertEqual (20130101, store.accounts ['1'][0])
+        
+        export = self.__WriteExport ([
+            '20130102,,1,,BA,Af,2,Betaalautomaat,krant',
+            '20130102,,1,,BA,Af,1.5,Betaalautomaat,koffie'])
+        self.assertEqual (2, len (store.Ingest (export)))
+        csv = CsvTool (inColTypes={'BedragEUR': 'cents'})
+        csv.LoadFile (self.filename)
+        self.assertEqual ([300, 200, 150], csv.GetColumn ('BedragEUR'))
+
+if __name__ == '__main__':
+    unittest.main()
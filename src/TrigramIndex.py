@@ -0,0 +1,53 @@
+from array import array
+
+class TrigramIndex:
+    """Inverted index from the trigrams (substrings of 3 characters) in a string column to the rows containing them.
+    It is used to find the rows which may contain a substring without scanning the whole column"""
+    def __init__ (self, inColumn):
+        self.column = inColumn
+        self.postings = {}
+        self.rowCount = 0
+        self.__Add (inColumn)
+
+    def Extend (self, inCells):
+        """Add the cells appended to the column"""
+        if len (self.column) == self.rowCount:
+            # the index has a copy of the column, not the stored column which has the appended cells already
+            self.column.extend (inCells)
+        self.__Add (inCells)
+
+    def __Add (self, inCells):
+        for j, cell in enumerate (inCells, self.rowCount):
+            for trigram in set (cell [k:k + 3] for k in range (len (cell) - 2)):
+                rows = self.postings.get (trigram)
+                if rows is None:
+                    rows = self.postings [trigram] = array ('l')
+                rows.append (j)
+            self.rowCount += 1
+
+    def GetCandidates (self, inNeedle):
+        """Return the set of rows containing all trigrams of inNeedle, or None when inNeedle is too short to use the index"""
+        if len (inNeedle) < 3:
+            return None
+        postings = []
+        for trigram in set (inNeedle [k:k + 3] for k in range (len (inNeedle) - 2)):
+            rows = self.postings.get (trigram)
+            if rows is None:
+                return set ()
+            postings.append (rows)
+        # start with the shortest list of rows, so the sets stay small
+        postings.sort (key=len)
+        candidates = set (postings [0])
+        for rows in postings [1:]:
+            candidates.intersection_update (rows)
+            if not candidates:
+                break
+        return candidates
+
+    def Search (self, inNeedle):
+        """Return the sorted rows of which the cell contains inNeedle"""
+        candidates = self.GetCandidates (inNeedle)
+        if candidates is None:
+            candidates = xrange (len (self.column))
+        column = self.column
+        return [j for j in sorted (candidates) if inNeedle in column [j]]
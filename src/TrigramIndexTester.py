@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+import unittest
+import logging
+from TrigramIndex import TrigramIndex
+
+# setup logger
+logging.basicConfig(format='%(asctime)-15s %(message)s', filename='TrigramIndexTester.log')
+logger = logging.getLogger(__name__)
+
+
+class TrigramIndexTester(unittest.TestCase):
+
+    def setUp(self):
+        self.index = TrigramIndex (['GAMMA LEIDEN', 'albert heijn', 'gamma leiden', '', 'ns', 'de bosrand gamma'])
+
+    def testGetCandidates (self):
+        """The candidates should be the rows containing all trigrams of the substring"""
+        self.assertEqual (set([2, 5]), self.index.GetCandidates ('gamma'))
+        self.assertEqual (set(), self.index.GetCandidates ('formido'))
+        self.assertEqual (None, self.index.GetCandidates ('ns'))
+
+    def testSearch (self):
+        """Search should only return the rows which really contain the substring"""
+        self.assertEqual ([2, 5], self.index.Search ('gamma'))
+        self.assertEqual ([2], self.index.Search ('a leid'))
+        self.assertEqual ([2, 5], self.index.Search ('ma'))
+        self.assertEqual ([], self.index.Search ('leiden gamma'))
+
+if __name__ == '__main__':
+    unittest.main()